@@ -1,6 +1,16 @@
+import gc
+import os
 import sys
+import threading
+import warnings
+import weakref
+from fnmatch import fnmatchcase
 from inspect import getmembers, getmro, isclass
+from itertools import repeat
+from operator import is_, itemgetter
 from pkgutil import iter_modules
+from time import perf_counter
+from types import BuiltinFunctionType, FunctionType, ModuleType
 
 from venusian.advice import getFrameInfo
 from venusian.compat import compat_find_loader
@@ -8,12 +18,144 @@ from venusian.compat import compat_find_loader
 ATTACH_ATTR = "__venusian_callbacks__"
 LIFTONLY_ATTR = "__venusian_liftonly_callbacks__"
 
+# Default for the ``lean`` argument of ``attach``.
+LEAN_ATTACH_INFO = False
+
+# Maps a module name to the set of categories of the callbacks registered by
+# decorators executed in that module (``_module_categories``), and any dotted
+# name prefix to the categories registered anywhere below it
+# (``_subtree_categories``).  Callbacks are only ever invoked while scanning
+# the module named by their ``cb_mod_name``, so a category-filtered scan can
+# use these to skip modules and packages which cannot match.
+_module_categories = {}
+_subtree_categories = {}
+
+# Incremented whenever callbacks are attached to or detached from objects;
+# scanners use it to tell whether the callbacks they cached are stale.
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def _attachments_changed():
+    global _generation
+    with _generation_lock:
+        _generation += 1
+
+
+# Locks serializing changes to the attachments of an object (see
+# ``_attach_lock``), striped so that threads importing unrelated modules
+# concurrently don't contend for one lock.
+_attach_locks = tuple(threading.Lock() for i in range(64))
+
+
+def _attach_lock(ob):
+    # ids are aligned addresses; drop the low bits which are always zero
+    return _attach_locks[(id(ob) >> 4) % len(_attach_locks)]
+
+
+# Maps a module name to weak references to the LeanAttachInfos of the
+# decorations made in that module which still hold frame namespaces.
+_lean_infos = {}
+
+# Set by ``freeze`` to a tuple ``(strict, changes)``; see ``_frozen_change``.
+_frozen = None
+
+# Names of packages whose whole subtree was imported by a previous scan
+# without errors or ignored submodules; their subtree index is complete.
+_complete_packages = set()
+
+# ``None``, or a pair of the ``_site_key`` of ``sys.path`` and the index of
+# entry points built by ``_entry_point_index`` for it.
+_entry_points = None
+
+# ``None``, or, once enabled by ``cache_import_failures``, a dictionary
+# mapping the names of modules which failed to import during a scan to the
+# ``sys.exc_info()`` of the failure.
+_import_failures = None
+
+# Names of the modules in which callbacks were attached to functions or
+# classes defined in another module; scans of other modules skip the
+# functions and classes they didn't define without looking for callbacks.
+_foreign_modules = set()
+
+# Exact types of the module members which are never looked for callbacks.
+_unattachable_types = frozenset(
+    [
+        BuiltinFunctionType,
+        ModuleType,
+        bool,
+        bytearray,
+        bytes,
+        complex,
+        dict,
+        float,
+        frozenset,
+        int,
+        list,
+        set,
+        str,
+        tuple,
+        type(None),
+    ]
+)
+
+# The name of the module a class was defined in, read from its __dict__
+# without going through its metaclass.
+_class_module = type.__dict__["__module__"].__get__
+
+# The namespace of a class, read the same way.
+_class_dict = type.__dict__["__dict__"].__get__
+
+_empty = frozenset()
+_missing = object()
+_first = itemgetter(0)
+
+# Maps a class to the callbacks merged from its MRO by ``lift``, keyed by the
+# ``categories`` of the lift decorator (see ``lift._merge_bases``).
+_lift_cache = weakref.WeakKeyDictionary()
+# Maps a class to the snapshots of its callback lists held by lifted chain
+# nodes, keyed by the id of the list (see ``_lift_node``).
+_lift_snapshots = weakref.WeakKeyDictionary()
+# Maps a scanner to the callbacks resolved by its scans (see ``_Scan.resolve``),
+# kept out of the scanner's own attributes.
+_resolved_caches = weakref.WeakKeyDictionary()
+
+
+def _index_category(module_name, category):
+    if module_name is None:
+        return
+    own = _module_categories.get(module_name)
+    if own is None:
+        own = _module_categories.setdefault(module_name, set())
+    if category in own:
+        return
+    own.add(category)
+    parts = module_name.split(".")
+    for i in range(1, len(parts) + 1):
+        prefix = ".".join(parts[:i])
+        _subtree_categories.setdefault(prefix, set()).add(category)
+
 
 class Scanner(object):
     def __init__(self, **kw):
         self.__dict__.update(kw)
 
-    def scan(self, package, categories=None, onerror=None, ignore=None):
+    def scan(
+        self,
+        package,
+        categories=None,
+        onerror=None,
+        ignore=None,
+        import_budget=None,
+        over_budget="warn",
+        consume=False,
+        import_workers=None,
+        discovery=None,
+        modules=None,
+        ignore_files=False,
+        module_policy=None,
+        lazy_attributes=False,
+    ):
         """Scan a Python package and any of its subpackages.  All
         top-level objects will be considered; those marked with
         venusian callback attributes related to ``category`` will be
@@ -45,7 +187,9 @@ class Scanner(object):
                     raise # reraise the last exception
 
         The ``name`` passed to ``onerror`` is the module or package dotted
-        name that could not be imported due to an exception.
+        name that could not be imported due to an exception.  Use
+        :func:`venusian.cache_import_failures` to have later scans hand it
+        the same exception again rather than retrying the import.
 
         .. versionadded:: 1.0
            the ``onerror`` callback
@@ -100,138 +244,964 @@ class Scanner(object):
 
         .. versionadded:: 1.0a3
            the ``ignore`` argument
+
+        When ``categories`` is not ``None``, modules which contain no
+        decorations in any of the requested categories are imported but
+        their members are not examined, and subpackages which a previous
+        scan imported completely are not traversed (nor imported again) if
+        none of their modules contain such decorations.
+
+        .. versionchanged:: 3.2
+           category-filtered scans skip modules and subpackages without
+           matching decorations
+
+        The ``import_budget`` argument, if not ``None``, is the number of
+        seconds importing any single module or subpackage during the scan
+        may take.  What happens to a module whose import takes longer
+        depends on ``over_budget``:
+
+        - ``"warn"`` (the default) issues a
+          :class:`venusian.ImportBudgetWarning`.
+
+        - ``"collect"`` makes ``scan`` return a list of the
+          :class:`venusian.ImportBudgetExceeded` exceptions describing each
+          of them once it's done.
+
+        - ``"raise"`` raises the :class:`venusian.ImportBudgetExceeded`
+          exception describing the first of them, ending the scan.
+
+        .. versionadded:: 3.2
+           the ``import_budget`` and ``over_budget`` arguments
+
+        If ``consume`` is true, the callbacks run by the scan are detached
+        from the objects they were attached to once each module has been
+        scanned, so that the memory they hold (such as decorator arguments
+        captured by callback closures) can be reclaimed when the callbacks
+        have copied what they need elsewhere.  Later scans don't find them.
+        Callbacks attached to classes are kept for :class:`venusian.lift`
+        to lift into subclasses defined later, as if the classes had been
+        decorated with :class:`venusian.onlyliftedfrom`.
+
+        .. versionadded:: 3.2
+           the ``consume`` argument
+
+        If ``import_workers`` is a number greater than 1, the submodules and
+        subpackages of ``package`` which the scan won't skip are first
+        imported by a pool of that many threads, siblings concurrently
+        (packages before their contents), which speeds up scanning modules
+        which wait on I/O when imported, or any modules on free-threaded
+        Python builds.  The scan then proceeds as usual, invoking callbacks
+        in the same order as without ``import_workers``; modules which
+        failed to import in a thread are imported again then, so that errors
+        are reported to ``onerror`` as usual.  Module code must be safe to
+        import concurrently with its siblings.
+
+        .. versionadded:: 3.2
+           the ``import_workers`` argument
+
+        The ``discovery`` argument selects how the submodules and
+        subpackages of ``package`` are found; see
+        :func:`venusian.walk_packages`.
+
+        .. versionadded:: 3.2
+           the ``discovery`` argument
+
+        If ``modules`` is not ``None``, only the modules it names are
+        scanned, rather than the whole package: it should be an iterable of
+        the dotted names of modules or packages in ``package``, and/or of
+        the paths of their files (strings containing a path separator,
+        ending with the suffix of a module file or naming an existing file,
+        or :class:`os.PathLike` objects), such as those a change touched.
+        Paths are mapped to module names relative to the ``__path__`` of
+        ``package`` without walking it; paths of files which don't exist, or
+        aren't Python modules of ``package``, are skipped, so that the list
+        of files changed can be passed as is.  Each module named is
+        imported, along with its parent packages, but only its own members
+        are examined; ``discovery`` and ``import_workers`` aren't used.
+        Ignored modules, or modules in ignored packages, are skipped.
+
+        .. versionadded:: 3.2
+           the ``modules`` argument
+
+        If ``ignore_files`` is true, the submodules and subpackages of
+        ``package`` matched by the glob patterns in ``.venusianignore`` files
+        in its directories are skipped (and not imported), as described for
+        :func:`venusian.walk_packages`, so that each package can prune
+        subtrees like ``tests`` or ``migrations`` of its own without a
+        central ``ignore`` list.  They don't apply to ``modules``.
+
+        .. versionadded:: 3.2
+           the ``ignore_files`` argument
+
+        The ``module_policy`` argument, if not ``None``, should be a
+        :class:`venusian.ModulePolicy` deciding how many of the members of
+        each module are examined according to its kind (extension,
+        sourceless or source), for instance to skip compiled extension
+        modules bundled in ``package``, and counting those skipped.
+
+        .. versionadded:: 3.2
+           the ``module_policy`` argument
+
+        Only the objects in the ``__dict__`` of each module are examined, so
+        that attributes which a module-level ``__getattr__`` (:pep:`562`)
+        loads lazily stay unloaded.  If ``lazy_attributes`` is true, the
+        names listed by ``dir()`` are looked up on modules instead, as
+        :func:`inspect.getmembers` does, loading those attributes.
+
+        .. versionchanged:: 3.2
+           the lazy attributes of modules are no longer examined by default
         """
 
-        pkg_name = package.__name__
+        return _scan_package(
+            package,
+            [_Scan(self, package, categories, ignore, consume)],
+            onerror,
+            import_budget,
+            over_budget,
+            import_workers,
+            discovery,
+            modules,
+            ignore_files,
+            module_policy,
+            lazy_attributes,
+        )
+
+
+def multiscan(
+    package,
+    scans,
+    onerror=None,
+    import_budget=None,
+    over_budget="warn",
+    import_workers=None,
+    discovery=None,
+    modules=None,
+    ignore_files=False,
+    module_policy=None,
+    lazy_attributes=False,
+):
+    """Scan a Python package and any of its subpackages on behalf of several
+    scanners at once.  Modules are discovered, imported and have their
+    members examined once, and each decorated object found is dispatched to
+    every scanner interested in it, rather than the whole package being
+    traversed once per scanner.
+
+    ``scans`` should be a sequence of ``(scanner, kw)`` pairs, where
+    ``scanner`` is a :class:`venusian.Scanner` and ``kw`` a dictionary which
+    may contain ``categories``, ``ignore`` and ``consume`` arguments for
+    it, with the same meaning as those of :meth:`venusian.Scanner.scan`.  A module or
+    package is only skipped if all the scanners ignore it.
+
+    ``onerror``, ``import_budget``, ``over_budget``, ``import_workers``,
+    ``discovery``, ``modules``, ``ignore_files``, ``module_policy`` and
+    ``lazy_attributes`` have the same meaning as for
+    :meth:`venusian.Scanner.scan`.
+
+    The callbacks found in each object are invoked scanner after scanner,
+    in the order of ``scans``.
+    """
+    return _scan_package(
+        package,
+        [_Scan(scanner, package, **kw) for scanner, kw in scans],
+        onerror,
+        import_budget,
+        over_budget,
+        import_workers,
+        discovery,
+        modules,
+        ignore_files,
+        module_policy,
+        lazy_attributes,
+    )
 
-        if ignore is not None and (
-            isinstance(ignore, str) or not hasattr(ignore, "__iter__")
-        ):
-            ignore = [ignore]
-        elif ignore is None:
-            ignore = []
-
-        # non-leading-dotted name absolute object name
-        str_ignores = [ign for ign in ignore if isinstance(ign, str)]
-        # leading dotted name relative to scanned package
-        rel_ignores = [ign for ign in str_ignores if ign.startswith(".")]
-        # non-leading dotted names
-        abs_ignores = [ign for ign in str_ignores if not ign.startswith(".")]
-        # functions, e.g. re.compile('pattern').search
-        callable_ignores = [ign for ign in ignore if callable(ign)]
-
-        def _ignore(fullname):
-            for ign in rel_ignores:
-                if fullname.startswith(pkg_name + ign):
-                    return True
-            for ign in abs_ignores:
-                # non-leading-dotted name absolute object name
-                if fullname.startswith(ign):
-                    return True
-            for ign in callable_ignores:
-                if ign(fullname):
-                    return True
-            return False
-
-        def invoke(mod_name, name, ob):
-            fullname = mod_name + "." + name
-
-            if _ignore(fullname):
-                return
 
-            category_keys = categories
+def scan_entry_points(scanner, group, onerror=None, cache_file=None, **kw):
+    """Scan the modules named by the entry points of ``group`` (such as
+    ``'myapp.plugins'``) of the installed distributions with ``scanner``, a
+    :class:`venusian.Scanner`.  The module of an entry point is the part of
+    its value before the colon; a module nested in another one which is
+    scanned is not scanned twice.
+
+    Finding entry points means reading the metadata of every installed
+    distribution, so the index of the modules of each group is cached, in
+    memory and, if ``cache_file`` is the path of a (writable) file, on disk
+    for later processes.  The index is rebuilt when the modification time
+    of any directory in ``sys.path`` changes, as it does when a
+    distribution is installed or removed (so ``cache_file`` shouldn't be in
+    one of them).
+
+    ``onerror`` has the same meaning as for :meth:`venusian.Scanner.scan`,
+    and is also called when a module fails to import.  Other keyword
+    arguments (``categories``, ``ignore`` and ``consume``) are passed on as
+    for :meth:`venusian.Scanner.scan`.
+
+    Return the names of the modules scanned.
+    """
+    names = _entry_point_index(cache_file).get(group, [])
+    scanned = []
+    for name in sorted(set(names)):
+        if any(name.startswith(parent + ".") for parent in scanned):
+            continue
+        try:
+            _import(name)
+        except Exception:
+            if onerror is None:
+                raise
+            onerror(name)
+            continue
+        module = sys.modules[name]
+        _scan_package(module, [_Scan(scanner, module, **kw)], onerror)
+        scanned.append(name)
+    return scanned
+
+
+def _site_key(paths):
+    # the modification times of the paths which exist
+    key = []
+    for path in paths:
+        try:
+            key.append([path, os.stat(path or ".").st_mtime_ns])
+        except OSError:
+            pass
+    return key
+
+
+def _entry_point_index(cache_file):
+    # Return a dictionary mapping entry point groups to the names of the
+    # modules of their entry points, cached for the current sys.path.
+    global _entry_points
+    # json is only needed here
+    import json
+
+    key = _site_key(sys.path)
+    if _entry_points is not None and _entry_points[0] == key:
+        return _entry_points[1]
+    index = None
+    if cache_file is not None:
+        try:
+            with open(cache_file) as f:
+                cached = json.load(f)
+            if cached["key"] == key:
+                index = cached["index"]
+        except (OSError, ValueError, LookupError, TypeError):
+            # missing, unreadable or corrupt
+            pass
+    if index is None:
+        index = {}
+        for entry_point in _all_entry_points():
+            module = entry_point.module
+            modules = index.setdefault(entry_point.group, [])
+            if module not in modules:
+                modules.append(module)
+        if cache_file is not None:
+            tmp = "%s.%d.tmp" % (cache_file, os.getpid())
             try:
-                # Some metaclasses do insane things when asked for an
-                # ``ATTACH_ATTR``, like not raising an AttributeError but
-                # some other arbitary exception.  Some even shittier
-                # introspected code lets us access ``ATTACH_ATTR`` far but
-                # barfs on a second attribute access for ``attached_to``
-                # (still not raising an AttributeError, but some other
-                # arbitrary exception).  Finally, the shittiest code of all
-                # allows the attribute access of the ``ATTACH_ATTR`` *and*
-                # ``attached_to``, (say, both ``ob.__getattr__`` and
-                # ``attached_categories.__getattr__`` returning a proxy for
-                # any attribute access), which either a) isn't callable or b)
-                # is callable, but, when called, shits its pants in an
-                # potentially arbitrary way (although for b, only TypeError
-                # has been seen in the wild, from PyMongo).  Thus the
-                # catchall except: return here, which in any other case would
-                # be high treason.
-                attached_categories = getattr(ob, ATTACH_ATTR)
-                if not attached_categories.attached_to(mod_name, name, ob):
-                    return
-            except:
+                with open(tmp, "w") as f:
+                    json.dump({"key": key, "index": index}, f)
+                os.replace(tmp, cache_file)
+            except OSError:
+                pass
+    _entry_points = (key, index)
+    return index
+
+
+def _all_entry_points():
+    # importlib.metadata is slow to import; only do so when needed
+    from importlib.metadata import distributions
+
+    for distribution in distributions():
+        for entry_point in distribution.entry_points:
+            yield entry_point
+
+
+class _Scan(object):
+    """The state of the scan of a package by one scanner."""
+
+    def __init__(self, scanner, package, categories=None, ignore=None, consume=False):
+        self.scanner = scanner
+        self.categories = categories
+        self.ignore = _make_ignore(package.__name__, ignore)
+        # names of the packages and modules ignored during the traversal
+        self.ignored = set()
+        # when consuming, (ob, categories) pairs of the objects whose
+        # callbacks ran in the module being scanned
+        self.consumed = [] if consume else None
+        # maps (module name, name, id(ob)) to the callbacks resolved for ob
+        # (see _resolve_callbacks), while ob is alive and no attachments
+        # changed since
+        try:
+            self.resolved_cache = _resolved_caches.setdefault(scanner, {})
+        except TypeError:
+            # not weakrefable (or hashable); cache for this scan only
+            self.resolved_cache = {}
+
+    def wants_module(self, mod_name):
+        # whether the members of the module named mod_name should be
+        # examined: a module imported for another scanner may be in a
+        # package this one ignored
+        parts = mod_name.split(".")
+        for i in range(1, len(parts) + 1):
+            if ".".join(parts[:i]) in self.ignored:
+                return False
+        # a category-filtered scan can skip modules which registered no
+        # callbacks in any of the requested categories
+        if self.categories is None:
+            return True
+        return not _module_categories.get(mod_name, _empty).isdisjoint(self.categories)
+
+    def prunes_package(self, fullname):
+        # skip subpackages already known to hold no matching callbacks
+        return (
+            self.categories is not None
+            and fullname in _complete_packages
+            and _subtree_categories.get(fullname, _empty).isdisjoint(self.categories)
+        )
+
+    def invoke(self, mod_name, name, ob):
+        if not self.ignore(mod_name + "." + name):
+            self.dispatch(name, ob, self.resolve(mod_name, name, ob))
+
+    def resolve(self, mod_name, name, ob):
+        if self.consumed is not None:
+            # the callbacks found are about to be detached; caching them
+            # would keep them alive
+            return _resolve_callbacks(mod_name, name, ob)
+        resolved_cache = self.resolved_cache
+        key = (mod_name, name, id(ob))
+        cached = resolved_cache.get(key)
+        if cached is not None and cached[0] == _generation and cached[1]() is ob:
+            return cached[2]
+        resolved = _resolve_callbacks(mod_name, name, ob)
+        try:
+            ref = weakref.ref(ob, lambda ref: resolved_cache.pop(key, None))
+        except TypeError:
+            # not weakrefable, so its id may be reused
+            pass
+        else:
+            resolved_cache[key] = (_generation, ref, resolved)
+        return resolved
+
+    def dispatch(self, name, ob, resolved):
+        if not resolved:
+            return
+        if self.categories is None:
+            category_keys = resolved
+        else:
+            category_keys = self.categories
+        for category in category_keys:
+            for callback in resolved.get(category, ()):
+                callback(self.scanner, name, ob)
+        if self.consumed is not None:
+            categories = [
+                category for category in category_keys if resolved.get(category)
+            ]
+            if categories:
+                self.consumed.append((ob, categories))
+
+    def consume(self, mod_name):
+        # detach the callbacks which ran in mod_name, the module just scanned
+        if self.consumed:
+            if _frozen is not None:
+                _frozen_change(_caller_codeinfo())
+            for ob, categories in self.consumed:
+                _consume(ob, categories, mod_name)
+            del self.consumed[:]
+            _attachments_changed()
+
+
+def _make_ignore(pkg_name, ignore):
+    # Return a function telling whether a full dotted name matches the
+    # ``ignore`` argument of ``Scanner.scan``
+    if ignore is not None and (
+        isinstance(ignore, str) or not hasattr(ignore, "__iter__")
+    ):
+        ignore = [ignore]
+    elif ignore is None:
+        ignore = []
+
+    # non-leading-dotted name absolute object name
+    str_ignores = [ign for ign in ignore if isinstance(ign, str)]
+    # leading dotted name relative to scanned package
+    rel_ignores = [ign for ign in str_ignores if ign.startswith(".")]
+    # non-leading dotted names
+    abs_ignores = [ign for ign in str_ignores if not ign.startswith(".")]
+    # functions, e.g. re.compile('pattern').search
+    callable_ignores = [ign for ign in ignore if callable(ign)]
+
+    def _ignore(fullname):
+        for ign in rel_ignores:
+            if fullname.startswith(pkg_name + ign):
+                return True
+        for ign in abs_ignores:
+            # non-leading-dotted name absolute object name
+            if fullname.startswith(ign):
+                return True
+        for ign in callable_ignores:
+            if ign(fullname):
+                return True
+        return False
+
+    return _ignore
+
+
+class ImportBudgetExceeded(Exception):
+    """Describes a module whose import during a scan took longer than the
+    ``import_budget`` passed to :meth:`venusian.Scanner.scan`.
+
+    Its ``name``, ``seconds``, ``parent`` and ``budget`` attributes are the
+    dotted name of the module, the number of seconds its import took, the
+    dotted name of the package whose traversal imported it and the budget
+    it exceeded."""
+
+    def __init__(self, name, seconds, parent, budget):
+        Exception.__init__(
+            self,
+            "importing %s (from package %s) took %.3fs, over the budget of "
+            "%.3fs" % (name, parent, seconds, budget),
+        )
+        self.name = name
+        self.seconds = seconds
+        self.parent = parent
+        self.budget = budget
+
+
+class ImportBudgetWarning(UserWarning):
+    """The warning issued for a module whose import took longer than the
+    ``import_budget`` passed to :meth:`venusian.Scanner.scan`."""
+
+
+def _make_import(budget, policy, reports, prefetched):
+    # Return a function importing a module, which reports it according to
+    # policy if that takes longer than budget seconds, counting the time
+    # spent importing it beforehand recorded in prefetched.
+    if policy not in ("warn", "collect", "raise"):
+        raise ValueError("unknown over_budget policy %r" % (policy,))
+    if budget is None:
+        return _import
+
+    def import_(name):
+        start = perf_counter()
+        _import(name)
+        seconds = perf_counter() - start + prefetched.pop(name, 0.0)
+        if seconds > budget:
+            exceeded = ImportBudgetExceeded(
+                name, seconds, name.rpartition(".")[0], budget
+            )
+            if policy == "raise":
+                raise exceeded
+            if policy == "warn":
+                warnings.warn(str(exceeded), ImportBudgetWarning)
+            reports.append(exceeded)
+
+    return import_
+
+
+class ModulePolicy(object):
+    """A policy for :meth:`venusian.Scanner.scan` and
+    :func:`venusian.multiscan` deciding how many of the members of each
+    module to examine according to its kind: ``"extension"`` for compiled
+    extension modules, ``"sourceless"`` for modules loaded from bytecode
+    (``.pyc``) files without source, and ``"source"`` for all others.
+    Modules are classified by the loader or the origin in their
+    ``__spec__``.
+
+    ``extension``, ``sourceless`` and ``source`` are the number of members of
+    modules of that kind to examine, in name order: ``None`` for all of
+    them, and ``0`` for none, in which case the members aren't even listed.
+    By default, the members of extension modules, whose (often thousands
+    of) members are rarely decorated by venusian decorators, are skipped.
+
+    As the policy is used, its ``modules`` and ``skipped`` attributes count,
+    for each kind, the modules scanned and the objects which weren't
+    examined because of it.
+    """
+
+    def __init__(self, extension=0, sourceless=None, source=None):
+        self.limits = {
+            "extension": extension,
+            "sourceless": sourceless,
+            "source": source,
+        }
+        self.modules = dict.fromkeys(self.limits, 0)
+        self.skipped = dict.fromkeys(self.limits, 0)
+
+
+def _module_members(module, lazy_attributes=False):
+    # Return the (name, object) pairs of the members of module sorted by
+    # name, only looking at those in its __dict__ unless lazy_attributes is
+    # true, so that no module-level __getattr__ runs.
+    if lazy_attributes:
+        return getmembers(module)
+    return sorted(vars(module).items(), key=_first)
+
+
+def _module_kind(module):
+    # Classify module as an "extension", "sourceless" or "source" module
+    # for ModulePolicy.
+    from importlib.machinery import (
+        BYTECODE_SUFFIXES,
+        EXTENSION_SUFFIXES,
+        ExtensionFileLoader,
+        SourcelessFileLoader,
+    )
+
+    spec = getattr(module, "__spec__", None)
+    loader = getattr(spec, "loader", None)
+    if isinstance(loader, ExtensionFileLoader):
+        return "extension"
+    if isinstance(loader, SourcelessFileLoader):
+        return "sourceless"
+    origin = getattr(spec, "origin", None)
+    if isinstance(origin, str):
+        if origin.endswith(tuple(EXTENSION_SUFFIXES)):
+            return "extension"
+        if origin.endswith(tuple(BYTECODE_SUFFIXES)):
+            return "sourceless"
+    return "source"
+
+
+def _module_names(package, modules):
+    # Return the set of the names of the modules of package named by the
+    # dotted names and paths in modules, mapping paths to names without
+    # walking the package.
+    from importlib.machinery import all_suffixes
+
+    pkg_name = package.__name__
+    directories = [os.path.abspath(path) for path in getattr(package, "__path__", ())]
+    suffixes = all_suffixes()
+    names = set()
+    for module in modules:
+        if (
+            isinstance(module, str)
+            and "/" not in module
+            and os.sep not in module
+            and not module.endswith(tuple(suffixes))
+            and not os.path.isfile(module)
+        ):
+            if module != pkg_name and not module.startswith(pkg_name + "."):
+                raise ValueError(
+                    "%r is not a module of package %r" % (module, pkg_name)
+                )
+            names.add(module)
+            continue
+        path = os.path.abspath(module)
+        if not os.path.isfile(path):
+            continue
+        directory, filename = os.path.split(path)
+        for suffix in suffixes:
+            if filename.endswith(suffix):
+                stem = filename[: -len(suffix)]
+                break
+        else:
+            continue
+        for top in directories:
+            if directory == top:
+                parts = []
+            elif directory.startswith(os.path.join(top, "")):
+                parts = directory[len(top) + 1 :].split(os.sep)
+            else:
+                continue
+            if stem != "__init__":
+                parts.append(stem)
+            if all(part.isidentifier() for part in parts):
+                names.add(".".join([pkg_name] + parts))
+            break
+    return names
+
+
+def _scan_package(
+    package,
+    scans,
+    onerror,
+    import_budget=None,
+    over_budget="warn",
+    import_workers=None,
+    discovery=None,
+    modules=None,
+    ignore_files=False,
+    module_policy=None,
+    lazy_attributes=False,
+):
+    # Traverse package once, dispatching its objects to each of the
+    # _Scan instances in scans, or only the modules in modules if that's
+    # not None.  Return the imports over budget if over_budget is
+    # "collect".
+    pkg_name = package.__name__
+    reports = []
+    # maps the names of the modules imported by _prefetch_imports to the
+    # time it took
+    prefetched = {}
+    import_ = _make_import(import_budget, over_budget, reports, prefetched)
+
+    # names of modules and packages which were ignored or failed to
+    # import; their parent packages can't be marked complete
+    incomplete = []
+
+    def _walk_ignore(fullname):
+        # a module or package is only skipped when every scan ignores it
+        # or knows that it holds no matching callbacks
+        skip = True
+        ignored = False
+        for scan in scans:
+            if scan.ignore(fullname):
+                scan.ignored.add(fullname)
+                ignored = True
+            elif not scan.prunes_package(fullname):
+                skip = False
+        if skip and ignored:
+            incomplete.append(fullname)
+        return skip
+
+    def _onerror(name):
+        incomplete.append(name)
+        if onerror is None or isinstance(sys.exc_info()[1], ImportBudgetExceeded):
+            raise
+        onerror(name)
+
+    def _members(mod_name, module):
+        # the members of module which may have callbacks to run when
+        # scanning it: values of builtin types can't hold any, and unless
+        # the module attached callbacks to something it didn't define,
+        # those of functions and classes it imported ran in their own
+        # module (the one their __module__ named when they were attached)
+        foreign = mod_name in _foreign_modules
+        limit = None
+        if module_policy is not None:
+            kind = _module_kind(module)
+            limit = module_policy.limits[kind]
+            module_policy.modules[kind] += 1
+            if limit == 0:
+                module_policy.skipped[kind] += len(getattr(module, "__dict__", ()))
                 return
-            if category_keys is None:
-                category_keys = list(attached_categories.keys())
-                try:
-                    # When metaclasses return proxies for any attribute access
-                    # the list may contain keys of different types which might
-                    # not be sortable.  In that case we can just return,
-                    # because we're not dealing with a proper venusian
-                    # callback.
-                    category_keys.sort()
-                except TypeError:  # pragma: no cover
-                    return
-            for category in category_keys:
-                callbacks = attached_categories.get(category, [])
-                try:
-                    # Metaclasses might trick us by reaching this far and then
-                    # fail with too little values to unpack.
-                    for callback, cb_mod_name, liftid, scope in callbacks:
-                        if cb_mod_name != mod_name:
-                            # avoid processing objects that were imported into
-                            # this module but were not actually defined there
-                            continue
-                        callback(self, name, ob)
-                except ValueError:  # pragma: nocover
+        members = _module_members(module, lazy_attributes)
+        if limit is not None and len(members) > limit:
+            module_policy.skipped[kind] += len(members) - limit
+            del members[limit:]
+        for name, ob in members:
+            if type(ob) in _unattachable_types:
+                continue
+            if not foreign:
+                defined_in = _defining_module(ob)
+                if (
+                    defined_in is not None
+                    and defined_in != mod_name
+                    and not _rehomed(ob, defined_in)
+                ):
                     continue
+            yield name, ob
 
-        for name, ob in getmembers(package):
-            # whether it's a module or a package, we need to scan its
-            # members; walk_packages only iterates over submodules and
-            # subpackages
-            invoke(pkg_name, name, ob)
-
-        if hasattr(package, "__path__"):  # package, not module
-            results = walk_packages(
-                package.__path__,
-                package.__name__ + ".",
-                onerror=onerror,
-                ignore=_ignore,
-            )
+    def _invoke_members(mod_name, module):
+        wanting = [scan for scan in scans if scan.wants_module(mod_name)]
+        if not wanting:
+            return
+        if len(wanting) == 1:
+            invoke = wanting[0].invoke
+            for name, ob in _members(mod_name, module):
+                invoke(mod_name, name, ob)
+        else:
+            for name, ob in _members(mod_name, module):
+                fullname = mod_name + "." + name
+                resolved = _missing
+                for scan in wanting:
+                    if scan.ignore(fullname):
+                        continue
+                    if resolved is _missing:
+                        # the callbacks found don't depend on the scanner
+                        resolved = scan.resolve(mod_name, name, ob)
+                    scan.dispatch(name, ob, resolved)
+        for scan in wanting:
+            _release_attach_infos(mod_name, scan.categories)
+            scan.consume(mod_name)
+
+    def _scan_targets(names):
+        # maps the names of the packages containing the modules to scan to
+        # whether they're skipped
+        skipped = {}
+        for name in sorted(names):
+            if name == pkg_name:
+                _invoke_members(pkg_name, package)
+                continue
+            parts = name.split(".")
+            skip = False
+            for i in range(pkg_name.count(".") + 2, len(parts) + 1):
+                parent = ".".join(parts[:i])
+                if parent not in skipped:
+                    skipped[parent] = _walk_ignore(parent)
+                if skipped[parent]:
+                    skip = True
+                    break
+            if skip:
+                continue
+            try:
+                import_(name)
+            except Exception:
+                _onerror(name)
+            module = sys.modules.get(name)
+            if module is not None:
+                _invoke_members(name, module)
 
-            for importer, modname, ispkg in results:
-                loader = compat_find_loader(importer, modname)
-                if loader is not None:  # happens on pypy with orphaned pyc
+    if modules is not None:
+        _scan_targets(_module_names(package, modules))
+    else:
+        # whether it's a module or a package, we need to scan its
+        # members; walk_packages only iterates over submodules and
+        # subpackages
+        _invoke_members(pkg_name, package)
+
+    if modules is None and hasattr(package, "__path__"):  # package, not module
+        find_modules = _find_modules(discovery, ignore_files)
+        if import_workers is not None and import_workers > 1:
+
+            def skip(fullname):
+                return all(
+                    scan.ignore(fullname) or scan.prunes_package(fullname)
+                    for scan in scans
+                )
+
+            _prefetch_imports(package, skip, import_workers, prefetched, find_modules)
+
+        packages = [pkg_name]
+        results = _walk_packages(
+            package.__path__,
+            package.__name__ + ".",
+            _onerror,
+            _walk_ignore,
+            import_,
+            find_modules,
+        )
+
+        def _scan_module(modname, ispkg):
+            # NB: use __import__(modname) rather than
+            # loader.load_module(modname) to prevent
+            # inappropriate double-execution of module code;
+            # packages were already imported (and timed) by
+            # _walk_packages
+            try:
+                (_import if ispkg else import_)(modname)
+            except Exception:
+                _onerror(modname)
+            module = sys.modules.get(modname)
+            if module is not None:
+                _invoke_members(modname, module)
+
+        for importer, modname, ispkg in results:
+            if ispkg:
+                packages.append(modname)
+            if importer is None:
+                # found by a discovery backend which doesn't know finders
+                _scan_module(modname, ispkg)
+                continue
+            loader = compat_find_loader(importer, modname)
+            if loader is not None:  # happens on pypy with orphaned pyc
+                try:
+                    get_filename = getattr(loader, "get_filename", None)
+                    if get_filename is None:  # pragma: nocover
+                        get_filename = loader._get_filename
                     try:
-                        get_filename = getattr(loader, "get_filename", None)
-                        if get_filename is None:  # pragma: nocover
-                            get_filename = loader._get_filename
-                        try:
-                            fn = get_filename(modname)
-                        except TypeError:  # pragma: nocover
-                            fn = get_filename()
-
-                        # NB: use __import__(modname) rather than
-                        # loader.load_module(modname) to prevent
-                        # inappropriate double-execution of module code
-                        try:
-                            __import__(modname)
-                        except Exception:
-                            if onerror is not None:
-                                onerror(modname)
-                            else:
-                                raise
-                        module = sys.modules.get(modname)
-                        if module is not None:
-                            for name, ob in getmembers(module, None):
-                                invoke(modname, name, ob)
-                    finally:
-                        if hasattr(loader, "file") and hasattr(
-                            loader.file, "close"
-                        ):  # pragma: nocover
-                            loader.file.close()
+                        fn = get_filename(modname)
+                    except TypeError:  # pragma: nocover
+                        fn = get_filename()
+
+                    _scan_module(modname, ispkg)
+                finally:
+                    if hasattr(loader, "file") and hasattr(
+                        loader.file, "close"
+                    ):  # pragma: nocover
+                        loader.file.close()
+
+        # a discovery backend may list only some of the modules of a
+        # package, and ignore files hide some of them
+        if discovery is None and not ignore_files:
+            for name in packages:
+                prefix = name + "."
+                if not any(i.startswith(prefix) for i in incomplete):
+                    _complete_packages.add(name)
+
+    if over_budget == "collect":
+        return reports
+
+
+def _consume(ob, categories, mod_name):
+    # Detach the callbacks in categories which a scan of the module named
+    # mod_name ran from ob, whose callbacks were found in its ATTACH_ATTR,
+    # moving those of a class to LIFTONLY_ATTR.  Callbacks attached by other
+    # modules (to an object they imported) haven't run, and are kept.
+    with _attach_lock(ob):
+        try:
+            attached = ob.__dict__[ATTACH_ATTR]
+        except Exception:
+            # inherited, already consumed, or some proxy
+            return
+        if isclass(ob):
+            liftonly = ob.__dict__.get(LIFTONLY_ATTR)
+            if liftonly is None:
+                liftonly = Categories(ob)
+                liftonly.attached_id = attached.attached_id
+                liftonly.lifted = attached.lifted
+                liftonly.defined_in = attached.defined_in
+                setattr(ob, LIFTONLY_ATTR, liftonly)
+            liftonly.version += 1
+        else:
+            liftonly = None
+        for category in categories:
+            callbacks = attached.get(category)
+            if callbacks is None:
+                continue
+            ran = []
+            kept = []
+            for entry in callbacks:
+                if entry[1] == mod_name:
+                    ran.append(entry)
+                else:
+                    kept.append(entry)
+            if not ran:
+                continue
+            if kept:
+                attached[category] = kept
+            else:
+                # keep a lifted class' callbacks as they are
+                ran = attached.pop(category)
+            if liftonly is not None:
+                previous = liftonly.get(category)
+                if previous is not None:
+                    ran = list(previous) + list(ran)
+                liftonly[category] = ran
+        attached.version += 1
+        if not attached:
+            delattr(ob, ATTACH_ATTR)
+
+
+def _prefetch_imports(package, skip, workers, durations, find_modules):
+    # Import the submodules and subpackages of package for which skip
+    # returns false in a pool of workers threads, recording the time each
+    # import took in durations.  Siblings are imported concurrently, and the
+    # contents of a package once it's imported.  Failures are ignored: the
+    # traversal imports those modules again and reports them.
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    def import_(name):
+        start = perf_counter()
+        # not _import: a failure which only happens in a worker thread
+        # mustn't be cached, the traversal imports the module again
+        __import__(name)
+        durations[name] = perf_counter() - start
+
+    def submit(path, prefix):
+        for importer, name, ispkg in find_modules(path, prefix):
+            if not skip(name):
+                futures[executor.submit(import_, name)] = (name, ispkg)
+
+    futures = {}
+    with ThreadPoolExecutor(workers) as executor:
+        submit(package.__path__, package.__name__ + ".")
+        while futures:
+            done, pending = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, ispkg = futures.pop(future)
+                if ispkg and future.exception() is None:
+                    path = getattr(sys.modules[name], "__path__", None)
+                    submit(path or [], name + ".")
+
+
+def _defining_module(ob):
+    # The name of the module which defined ob if it's a function or a
+    # class, or None; no code of ob's (or its metaclass') runs.
+    kind = type(ob)
+    if kind is FunctionType:
+        return ob.__module__
+    if issubclass(kind, type):
+        return _class_module(ob)
+    return None
+
+
+def _rehomed(ob, defined_in):
+    # Whether the __module__ of ob, a function or class, was changed to
+    # defined_in after callbacks were attached to it (as by a decorator
+    # re-exporting it from a package, applied after venusian's): the module
+    # which attached them may then be another one than defined_in.
+    namespace = _own_dict(ob)
+    categories = None if namespace is None else namespace.get(ATTACH_ATTR)
+    return type(categories) is Categories and categories.defined_in != defined_in
+
+
+def _own_dict(ob):
+    # The __dict__ of ob (its namespace, for a class), looked up like
+    # inspect.getattr_static does, so that no __getattr__ or
+    # __getattribute__ of ob's class or metaclass runs, or None.  Only an
+    # object's own callbacks can run when scanning it (the callbacks
+    # attached to a class' bases are attached_to them), so there's no need
+    # to look further.
+    if issubclass(type(ob), type):
+        return _class_dict(ob)
+    try:
+        namespace = object.__getattribute__(ob, "__dict__")
+    except AttributeError:
+        return None
+    if type(namespace) is not dict:
+        return None
+    return namespace
+
+
+def _resolve_callbacks(mod_name, name, ob):
+    """Return a dictionary mapping the categories of the callbacks attached to
+    ``ob`` (found as ``name`` in the module named ``mod_name``) to lists of
+    those which should be invoked when scanning it, in category order, or
+    ``None`` if there are none."""
+    try:
+        # Some metaclasses do insane things when asked for an
+        # ``ATTACH_ATTR``, like not raising an AttributeError but
+        # some other arbitary exception.  Some even shittier
+        # introspected code lets us access ``ATTACH_ATTR`` far but
+        # barfs on a second attribute access for ``attached_to``
+        # (still not raising an AttributeError, but some other
+        # arbitrary exception).  Finally, the shittiest code of all
+        # allows the attribute access of the ``ATTACH_ATTR`` *and*
+        # ``attached_to``, (say, both ``ob.__getattr__`` and
+        # ``attached_categories.__getattr__`` returning a proxy for
+        # any attribute access), which either a) isn't callable or b)
+        # is callable, but, when called, shits its pants in an
+        # potentially arbitrary way (although for b, only TypeError
+        # has been seen in the wild, from PyMongo).  Thus the
+        # catchall except: return here, which in any other case would
+        # be high treason.  ``ATTACH_ATTR`` itself is now looked up
+        # statically (see ``_own_dict``), so that such proxies aren't even
+        # built, but whatever is stored under that name may still be one.
+        namespace = _own_dict(ob)
+        if namespace is None:
+            return None
+        attached_categories = namespace.get(ATTACH_ATTR)
+        if attached_categories is None:
+            return None
+        if not attached_categories.attached_to(mod_name, name, ob):
+            return None
+    except:
+        return None
+    category_keys = list(attached_categories.keys())
+    try:
+        # When metaclasses return proxies for any attribute access
+        # the list may contain keys of different types which might
+        # not be sortable.  In that case we can just return,
+        # because we're not dealing with a proper venusian
+        # callback.
+        category_keys.sort()
+    except TypeError:
+        return None
+    resolved = {}
+    for category in category_keys:
+        callbacks = attached_categories.get(category, [])
+        try:
+            # Metaclasses might trick us by reaching this far and then
+            # fail with too little values to unpack.
+            resolved[category] = [
+                callback
+                for callback, cb_mod_name, liftid, scope in callbacks
+                # avoid processing objects that were imported into
+                # this module but were not actually defined there
+                if cb_mod_name == mod_name
+            ]
+        except ValueError:  # pragma: nocover
+            continue
+    return resolved
 
 
 class AttachInfo(object):
@@ -276,22 +1246,176 @@ class AttachInfo(object):
         self.__dict__.update(kw)
 
 
+class LeanAttachInfo(AttachInfo):
+    """
+    An :class:`venusian.AttachInfo` which doesn't keep the namespaces of the
+    decorator frame alive any longer than needed; it is returned by
+    :func:`venusian.attach` when called with ``lean=True``.
+
+    ``module`` is held through a weak reference, and ``globals`` (and
+    ``locals``, when the decorator ran at module scope) are looked up from
+    it on access.  Any other ``locals`` (those of a class statement or a
+    function call), or ``globals`` which aren't a module's, are dropped once
+    a scan has run the callbacks of the decorated module in the attached
+    ``category``; afterwards, they are ``None``.  ``scope``, ``category``
+    and ``codeinfo`` are kept as usual.
+    """
+
+    def __init__(self, scope, module, locals, globals, category, codeinfo):
+        self.scope = scope
+        self.category = category
+        self.codeinfo = codeinfo
+        self._module = None if module is None else weakref.ref(module)
+        self._locals_are_globals = locals is globals
+        if self._locals_are_globals:
+            locals = None
+        if module is not None and globals is module.__dict__:
+            globals = None  # retrieved from the module
+        self._globals = globals
+        self._locals = locals
+
+    @property
+    def module(self):
+        return self._module and self._module()
+
+    @property
+    def globals(self):
+        if self._globals is None:
+            module = self.module
+            if module is not None:
+                return module.__dict__
+        return self._globals
+
+    @property
+    def locals(self):
+        if self._locals_are_globals:
+            return self.globals
+        return self._locals
+
+    def release(self):
+        """Drop the references to the frame namespaces which can't be
+        retrieved from the module.  Scanning calls this automatically."""
+        self._locals = None
+        self._globals = None
+
+
 class Categories(dict):
+    __slots__ = ("attached_id", "lifted", "version", "defined_in")
+
     def __init__(self, attached_to):
         super(dict, self).__init__()
         if isinstance(attached_to, tuple):
             self.attached_id = attached_to
         else:
-            self.attached_id = id(attached_to)
+            try:
+                # unlike an id, a weak reference can't be mistaken for
+                # another object allocated at the same address after
+                # ``attached_to`` has been garbage collected
+                self.attached_id = weakref.ref(attached_to)
+            except TypeError:
+                self.attached_id = id(attached_to)
         self.lifted = False
+        # bumped whenever callbacks are added or removed in place, so that
+        # merges of the categories cached by ``lift`` can be invalidated
+        self.version = 0
+        # the ``__module__`` of the object when they were attached to it, so
+        # that scans notice if it's changed later (see ``_rehomed``)
+        self.defined_in = None
 
     def attached_to(self, mod_name, name, obj):
-        if isinstance(self.attached_id, int):
-            return self.attached_id == id(obj)
-        return self.attached_id == (mod_name, name)
-
+        attached_id = self.attached_id
+        if isinstance(attached_id, tuple):
+            return attached_id == (mod_name, name)
+        if isinstance(attached_id, int):
+            return attached_id == id(obj)
+        attached = attached_id()
+        return attached is not None and attached is obj
+
+
+class LiftedCallbacks(object):
+    """The callbacks of a category of a class decorated with
+    :class:`venusian.lift`, as found in its ``__venusian_callbacks__``.
+
+    Lifted callbacks are stored as a chain of ``(callbacks, liftids,
+    parent)`` nodes shared with the classes they're lifted from: each node
+    holds the callbacks attached to one class, the liftids of its class-scope
+    callbacks, and the node of the next class in the MRO.  Iterating yields
+    the same ``(callback, module_name, liftid, scope)`` tuples as a
+    callback list, with the inherited class-scope callbacks that a subclass
+    overrides left out and ``module_name`` set to the module which lifted
+    the class.  The memory used by a lifted class thus grows with its own
+    decorations rather than with the number of callbacks it inherits.
+
+    Callbacks appended to a lifted category (e.g. by a decorator applied to
+    the lifted class) are kept apart and yielded last.
+    """
 
-def attach(wrapped, callback, category=None, depth=1, name=None):
+    __slots__ = ("module_name", "node", "extra")
+
+    def __init__(self, module_name, node):
+        self.module_name = module_name
+        self.node = node
+        self.extra = None
+
+    def __iter__(self):
+        module_name = self.module_name
+        overridden = set()
+        node = self.node
+        while node is not None:
+            callbacks, liftids, node = node
+            for cb, _, liftid, scope in callbacks:
+                if scope != "class" or liftid not in overridden:
+                    yield cb, module_name, liftid, scope
+            overridden |= liftids
+        if self.extra:
+            for callback in self.extra:
+                yield callback
+
+    def __len__(self):
+        return sum(1 for callback in self)
+
+    def __getitem__(self, index):
+        return list(self)[index]
+
+    def __repr__(self):
+        return "<%s %r>" % (self.__class__.__name__, list(self))
+
+    def append(self, callback):
+        if self.extra is None:
+            self.extra = []
+        elif isinstance(self.extra, tuple):
+            # frozen by ``freeze``
+            self.extra = list(self.extra)
+        self.extra.append(callback)
+
+
+class PayloadCallback(object):
+    """A callback attached by :func:`venusian.attach` when it's given a
+    ``payload``: calling it with ``(scanner, name, ob)`` calls ``handler``
+    with ``(scanner, name, ob, payload)``."""
+
+    __slots__ = ("handler", "payload")
+
+    def __init__(self, handler, payload):
+        self.handler = handler
+        self.payload = payload
+
+    def __call__(self, scanner, name, ob):
+        return self.handler(scanner, name, ob, self.payload)
+
+    def __repr__(self):
+        return "<%s %r %r>" % (self.__class__.__name__, self.handler, self.payload)
+
+
+def attach(
+    wrapped,
+    callback,
+    category=None,
+    depth=1,
+    name=None,
+    lean=None,
+    payload=_missing,
+):
     """Attach a callback to the wrapped object.  It will be found
     later during a scan.  This function returns an instance of the
     :class:`venusian.AttachInfo` class.
@@ -302,6 +1426,19 @@ def attach(wrapped, callback, category=None, depth=1, name=None):
     ``name`` should be ``None`` or a string representing a subcategory within
     the category.  This will be used by the ``lift`` class decorator to
     determine if decorations of a method should be inherited or overridden.
+
+    If ``lean`` is true, a :class:`venusian.LeanAttachInfo` is returned
+    instead, which doesn't keep the decorator frame's namespaces alive after
+    the callback has been scanned.  When ``lean`` is ``None`` (the default),
+    the value of ``venusian.LEAN_ATTACH_INFO`` (``False`` unless changed) is
+    used.
+
+    If a ``payload`` is passed, ``callback`` will be called as
+    ``callback(scanner, name, ob, payload)`` instead of ``callback(scanner,
+    name, ob)``.  This lets a decorator attach one shared handler function
+    along with the (preferably immutable) settings of each decoration,
+    rather than creating a new closure each time; only a small
+    :class:`venusian.PayloadCallback` record is stored per decoration.
     """
 
     frame = sys._getframe(depth + 1)
@@ -312,27 +1449,58 @@ def attach(wrapped, callback, category=None, depth=1, name=None):
 
     liftid = "%s %s" % (wrapped_name, name)
 
+    if payload is not _missing:
+        callback = PayloadCallback(callback, payload)
+
+    if _frozen is not None:
+        # before anything is changed, in case it raises
+        _frozen_change(codeinfo)
+
     if scope == "class":
         # we're in the midst of a class statement
-        categories = f_locals.get(ATTACH_ATTR, None)
-        if categories is None or not categories.attached_to(
-            module_name, class_name, None
-        ):
-            categories = Categories((module_name, class_name))
-            f_locals[ATTACH_ATTR] = categories
-        callbacks = categories.setdefault(category, [])
+        owner = f_locals
+        defined_in = f_locals.get("__module__")
     else:
-        categories = getattr(wrapped, ATTACH_ATTR, None)
-        if categories is None or not categories.attached_to(
-            module_name, wrapped_name, wrapped
+        owner = wrapped
+        defined_in = _defining_module(wrapped)
+    if defined_in is not None and defined_in != module_name:
+        # scans of module_name must look at members it didn't define
+        _foreign_modules.add(module_name)
+
+    with _attach_lock(owner):
+        if scope == "class":
+            categories = f_locals.get(ATTACH_ATTR, None)
+            if categories is None or not categories.attached_to(
+                module_name, class_name, None
+            ):
+                categories = Categories((module_name, class_name))
+                categories.defined_in = defined_in
+                f_locals[ATTACH_ATTR] = categories
+        else:
+            categories = getattr(wrapped, ATTACH_ATTR, None)
+            if categories is None or not categories.attached_to(
+                module_name, wrapped_name, wrapped
+            ):
+                # if there aren't any attached categories, or we've retrieved
+                # some by inheritance, we need to create new ones
+                categories = Categories(wrapped)
+                categories.defined_in = defined_in
+                setattr(wrapped, ATTACH_ATTR, categories)
+
+        _add_callback(categories, category, (callback, module_name, liftid, scope))
+    _index_category(module_name, category)
+    _attachments_changed()
+
+    if lean is None:
+        lean = LEAN_ATTACH_INFO
+    if lean:
+        info = LeanAttachInfo(scope, module, f_locals, f_globals, category, codeinfo)
+        if module_name is not None and not (
+            info._locals is None and info._globals is None
         ):
-            # if there aren't any attached categories, or we've retrieved
-            # some by inheritance, we need to create new ones
-            categories = Categories(wrapped)
-            setattr(wrapped, ATTACH_ATTR, categories)
-        callbacks = categories.setdefault(category, [])
-
-    callbacks.append((callback, module_name, liftid, scope))
+            # released once the module has been scanned
+            _lean_infos.setdefault(module_name, []).append(weakref.ref(info))
+        return info
 
     return AttachInfo(
         scope=scope,
@@ -344,7 +1512,127 @@ def attach(wrapped, callback, category=None, depth=1, name=None):
     )
 
 
-def walk_packages(path=None, prefix="", onerror=None, ignore=None):
+def _add_callback(categories, category, entry):
+    # Append a (callback, module_name, liftid, scope) entry to the callbacks
+    # of category in categories; the caller holds the attach lock.
+    callbacks = categories.get(category)
+    if callbacks is None:
+        callbacks = categories[category] = []
+    elif isinstance(callbacks, tuple):
+        # frozen by ``freeze``
+        callbacks = categories[category] = list(callbacks)
+    callbacks.append(entry)
+    categories.version += 1
+
+
+def attach_method(wrapped, callback, category=None, name=None, payload=_missing):
+    """Attach a callback to the function ``wrapped`` defined in a class
+    statement, which will be found later when scanning the class, like
+    :func:`venusian.attach` called by a decorator of a method does, but
+    without inspecting the decorator's frame (or writing into the namespace
+    of the class statement through it).
+
+    Instead, a placeholder for ``wrapped`` is returned, which the decorator
+    should return in turn: when the class is created, its
+    ``__set_name__`` method adds the callback to the class' attachments,
+    where :class:`venusian.lift`, :class:`venusian.onlyliftedfrom` and scans
+    find it as if it had been attached by :func:`venusian.attach`, and
+    replaces itself with ``wrapped``.  Other decorators applied to the
+    placeholder must preserve that (those calling ``attach_method`` do).
+    The callback is attached once, however many names the class statement
+    binds the placeholder to.  Outside of a class statement, the placeholder
+    is never replaced, and calling it calls ``wrapped``; no callback is
+    attached.
+
+    ``category``, ``name`` and ``payload`` have the same meaning as for
+    :func:`venusian.attach`.  No :class:`venusian.AttachInfo` is returned.
+    """
+    if payload is not _missing:
+        callback = PayloadCallback(callback, payload)
+    if isinstance(wrapped, _MethodAttachment):
+        # stacked decorators
+        wrapped.attachments.append((callback, category, name))
+        return wrapped
+    return _MethodAttachment(wrapped, [(callback, category, name)])
+
+
+class _MethodAttachment(object):
+    # The placeholder returned by attach_method for a function until the
+    # class it's defined in is created.
+
+    def __init__(self, wrapped, attachments):
+        self.wrapped = wrapped
+        # (callback, category, name) triples, in the order of decoration
+        self.attachments = attachments
+        self.__name__ = getattr(wrapped, "__name__", None)
+
+    def __call__(self, *args, **kw):
+        # used outside of a class statement, where it's never replaced
+        return self.wrapped(*args, **kw)
+
+    def __set_name__(self, owner, attr_name):
+        wrapped = self.wrapped
+        attachments = self.attachments
+        # called again for each alias of the method in the class statement,
+        # which only needs replacing
+        self.attachments = []
+        if attachments:
+            self._attach(owner, attachments)
+        setattr(owner, attr_name, wrapped)
+
+    def _attach(self, owner, attachments):
+        wrapped = self.wrapped
+        module_name = owner.__module__
+        class_name = owner.__name__
+        if _frozen is not None:
+            code = getattr(wrapped, "__code__", None)
+            _frozen_change(
+                (
+                    getattr(code, "co_filename", None),
+                    getattr(code, "co_firstlineno", None),
+                    class_name,
+                    None,
+                )
+            )
+        with _attach_lock(owner):
+            categories = owner.__dict__.get(ATTACH_ATTR)
+            if categories is None or not categories.attached_to(
+                module_name, class_name, None
+            ):
+                categories = Categories((module_name, class_name))
+                categories.defined_in = module_name
+                setattr(owner, ATTACH_ATTR, categories)
+            for callback, category, name in attachments:
+                liftid = "%s %s" % (self.__name__, name)
+                entry = (callback, module_name, liftid, "class")
+                _add_callback(categories, category, entry)
+        for callback, category, name in attachments:
+            _index_category(module_name, category)
+        _attachments_changed()
+
+
+def _release_attach_infos(module_name, categories):
+    # Release the lean AttachInfos of the callbacks a scan of module_name
+    # has just run; those of other categories may still be needed.
+    refs = _lean_infos.pop(module_name, None)
+    if not refs:
+        return
+    keep = []
+    for ref in refs:
+        info = ref()
+        if info is None:
+            continue
+        if categories is None or info.category in categories:
+            info.release()
+        else:
+            keep.append(ref)
+    if keep:
+        _lean_infos.setdefault(module_name, []).extend(keep)
+
+
+def walk_packages(
+    path=None, prefix="", onerror=None, ignore=None, discovery=None, ignore_files=False
+):
     """Yields (module_loader, name, ispkg) for all modules recursively
     on path, or, if path is None, all accessible modules.
 
@@ -367,6 +1655,24 @@ def walk_packages(path=None, prefix="", onerror=None, ignore=None):
     object is skipped and not returned in results (and if it's a package it's
     not imported).
 
+    'discovery' selects how the modules of a package are found.  By default
+    (if it's None), pkgutil.iter_modules lists those on the package's
+    __path__.  Otherwise it should be an object whose index() method
+    returns a function with the same signature and results as
+    iter_modules; index() is called once per walk.  module_loader may be
+    None in its results.  venusian.TOCDiscovery and
+    venusian.ManifestDiscovery find the modules served by frozen
+    application importers, and those listed in a manifest.
+
+    'ignore_files', if true, makes the walk honor .venusianignore files in
+    the directories it lists: each of their lines (other than blank lines
+    and comments starting with #) is a glob pattern matched against the
+    modules and packages below that directory, which are skipped (and not
+    imported) if it matches.  A pattern without a slash matches names
+    (like "tests", "migrations" or "test_*") at any depth, and one with a
+    slash the path relative to the directory (like "api/v1"); a trailing
+    slash or .py suffix is ignored.  Each file is read once per walk.
+
     Examples:
 
     # list all modules python can access
@@ -378,14 +1684,25 @@ def walk_packages(path=None, prefix="", onerror=None, ignore=None):
     # NB: we can't just use pkgutils.walk_packages because we need to ignore
     # things
     """
+    return _walk_packages(
+        path, prefix, onerror, ignore, _import, _find_modules(discovery, ignore_files)
+    )
+
+
+def _walk_packages(path, prefix, onerror, ignore, import_, find_modules):
+    # walk_packages, importing packages with import_ and listing the
+    # modules of a package with find_modules
+
+    # path items seen by this call; never shared with concurrent walks
+    seen_paths = set()
 
-    def seen(p, m={}):
-        if p in m:  # pragma: no cover
+    def seen(p):
+        if p in seen_paths:  # pragma: no cover
             return True
-        m[p] = True
+        seen_paths.add(p)
 
     # iter_modules is nonrecursive
-    for importer, name, ispkg in iter_modules(path, prefix):
+    for importer, name, ispkg in find_modules(path, prefix):
         if ignore is not None and ignore(name):
             # if name is a package, ignoring here will cause
             # all subpackages and submodules to be ignored too
@@ -395,7 +1712,7 @@ def walk_packages(path=None, prefix="", onerror=None, ignore=None):
 
         if ispkg:
             try:
-                __import__(name)
+                import_(name)
             except Exception:
                 if onerror is not None:
                     onerror(name)
@@ -408,12 +1725,402 @@ def walk_packages(path=None, prefix="", onerror=None, ignore=None):
                 # don't traverse path items we've seen before
                 path = [p for p in path if not seen(p)]
 
-                for item in walk_packages(path, name + ".", onerror, ignore):
+                for item in _walk_packages(
+                    path, name + ".", onerror, ignore, import_, find_modules
+                ):
                     yield item
         else:
             yield importer, name, ispkg
 
 
+def compile_package(package, workers=None, invalidation_mode=None, ignore=None):
+    """Compile the source files of the submodules and subpackages of the
+    already imported ``package`` whose bytecode (``.pyc``) files are missing
+    or out of date, in a pool of ``workers`` processes (by default, one per
+    CPU), so that a scan of ``package`` which follows doesn't compile them
+    one by one as it imports them.  This is meant to be called once on the
+    first start of a fresh deployment, such as a new container.
+
+    Subpackages are found without being imported, from the locations
+    reported by their finders; modules which aren't plain source files
+    (extension modules, modules in zip files, ...) are left alone.
+
+    ``invalidation_mode`` is passed to :func:`compileall.compile_file`; use
+    :attr:`py_compile.PycInvalidationMode.UNCHECKED_HASH` for bytecode
+    files which are used without ever checking their source again, as in
+    read-only images.
+
+    ``ignore`` has the same meaning as for :meth:`venusian.Scanner.scan`,
+    except that only modules and packages are matched.
+
+    Return ``True`` if all the files were compiled successfully.
+    """
+    # process pools are slow to import; only do so when needed
+    from concurrent.futures import ProcessPoolExecutor
+
+    ignore = _make_ignore(package.__name__, ignore)
+    sources = list(_source_files(package.__path__, package.__name__ + ".", ignore))
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(sources) < 2:
+        results = map(_compile_source, sources, repeat(invalidation_mode))
+        return all(list(results))
+    with ProcessPoolExecutor(workers) as executor:
+        results = executor.map(
+            _compile_source,
+            sources,
+            repeat(invalidation_mode),
+            chunksize=max(1, len(sources) // (4 * workers)),
+        )
+        return all(list(results))
+
+
+def _source_files(path, prefix, ignore):
+    # Yield the source files of the modules found in path, recursively,
+    # without importing packages.
+    for importer, name, ispkg in iter_modules(path, prefix):
+        if ignore(name):
+            continue
+        try:
+            spec = importer.find_spec(name)
+        except Exception:  # pragma: no cover
+            continue
+        if spec is None:  # pragma: no cover
+            continue
+        if spec.has_location and spec.origin.endswith(".py"):
+            yield spec.origin
+        if ispkg and spec.submodule_search_locations:
+            for source in _source_files(
+                spec.submodule_search_locations, name + ".", ignore
+            ):
+                yield source
+
+
+def _compile_source(fullname, invalidation_mode):
+    # run in the processes of compile_package
+    import compileall
+
+    return compileall.compile_file(
+        fullname, quiet=2, invalidation_mode=invalidation_mode
+    )
+
+
+def _import(name):
+    # __import__(name), unless it's known to fail
+    if _import_failures is not None and name not in sys.modules:
+        failure = _import_failures.get(name)
+        if failure is not None:
+            raise failure[1].with_traceback(failure[2])
+        try:
+            __import__(name)
+        except Exception:
+            import traceback
+
+            exc_info = sys.exc_info()
+            # the frames of the failed import are done with; don't keep
+            # the partially executed module's namespace alive
+            traceback.clear_frames(exc_info[2])
+            _import_failures[name] = exc_info
+            raise
+    else:
+        __import__(name)
+
+
+def cache_import_failures(enabled=True):
+    """Enable (or, if ``enabled`` is false, disable) caching of import
+    failures.
+
+    While enabled, :meth:`venusian.Scanner.scan` and
+    :func:`venusian.walk_packages` remember the exception raised by each
+    module or package which fails to import.  Later scans raise that same
+    exception again for it (and so hand it to their ``onerror`` callback)
+    instead of attempting to import it again, until the failure is
+    forgotten by :func:`venusian.reset_import_failures`.
+
+    Disabling the cache forgets all failures recorded so far."""
+    global _import_failures
+    if not enabled:
+        _import_failures = None
+    elif _import_failures is None:
+        _import_failures = {}
+
+
+def import_failures():
+    """Return a dictionary mapping the names of the modules which the
+    import failure cache enabled by :func:`venusian.cache_import_failures`
+    holds to the ``(type, value, traceback)`` tuples of their failures."""
+    return dict(_import_failures or ())
+
+
+def reset_import_failures(name=None):
+    """Forget the cached import failure of the module named ``name`` (along
+    with those of its submodules) or, if ``name`` is ``None``, all cached
+    import failures, so that the next scan attempts to import them again.
+    The cache stays enabled."""
+    if not _import_failures:
+        return
+    if name is None:
+        _import_failures.clear()
+        return
+    prefix = name + "."
+    for failed in list(_import_failures):
+        if failed == name or failed.startswith(prefix):
+            del _import_failures[failed]
+
+
+def _find_modules(discovery, ignore_files=False):
+    find_modules = iter_modules if discovery is None else discovery.index()
+    if ignore_files:
+        find_modules = _ignore_files(find_modules)
+    return find_modules
+
+
+def _ignore_files(find_modules):
+    # Return a function wrapping find_modules, which leaves out the modules
+    # matched by the patterns in the .venusianignore files of the
+    # directories listed, and of those of their parent packages.
+
+    # maps directories to the patterns in their ignore file, read once
+    patterns = {}
+    # maps the prefixes of packages found to the (prefix of the package
+    # whose directory held it, pattern) pairs applying to their modules
+    inherited = {}
+
+    def find(path=None, prefix=""):
+        rules = list(inherited.get(prefix, ()))
+        for directory in path or ():
+            if directory not in patterns:
+                patterns[directory] = _read_ignore_file(directory)
+            rules.extend((prefix, pattern) for pattern in patterns[directory])
+        for item in find_modules(path, prefix):
+            name = item[1]
+            if any(_ignore_matches(name, base, pattern) for base, pattern in rules):
+                continue
+            if item[2] and rules:
+                inherited[name + "."] = rules
+            yield item
+
+    return find
+
+
+def _read_ignore_file(directory):
+    # Return the patterns in the .venusianignore file of directory.
+    try:
+        with open(os.path.join(directory, ".venusianignore")) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    patterns = []
+    for line in lines:
+        pattern = line.strip()
+        if not pattern or pattern.startswith("#"):
+            continue
+        pattern = pattern.strip("/")
+        if pattern.endswith(".py"):
+            pattern = pattern[:-3]
+        patterns.append(pattern)
+    return patterns
+
+
+def _ignore_matches(name, base, pattern):
+    # Whether pattern, from the ignore file of the directory of the package
+    # whose prefix is base, matches the module name.
+    relative = name[len(base) :]
+    if "/" in pattern:
+        return fnmatchcase(relative.replace(".", "/"), pattern)
+    return fnmatchcase(relative.rpartition(".")[2], pattern)
+
+
+class TOCDiscovery(object):
+    """A discovery backend for :func:`venusian.walk_packages` and
+    :meth:`venusian.Scanner.scan` which finds modules in the tables of
+    contents of import hooks, like those of frozen (PyInstaller-style)
+    applications whose modules :func:`pkgutil.iter_modules` can't list.
+
+    ``importers`` is the sequence of importers to look at (by default,
+    ``sys.meta_path`` when indexing).  Those with a ``toc`` attribute, a
+    collection of the dotted names of the modules they serve, are indexed;
+    their ``is_package`` method, if any, tells packages apart (otherwise,
+    only names with submodules in the index are packages).
+    """
+
+    def __init__(self, importers=None):
+        self.importers = importers
+
+    def index(self):
+        importers = self.importers
+        if importers is None:
+            importers = sys.meta_path
+        names = {}
+        for importer in importers:
+            toc = getattr(importer, "toc", None)
+            if not toc:
+                continue
+            is_package = getattr(importer, "is_package", None)
+            for name in toc:
+                if name in names:
+                    # served by an earlier importer
+                    continue
+                ispkg = False
+                if is_package is not None:
+                    try:
+                        ispkg = bool(is_package(name))
+                    except Exception:
+                        pass
+                names[name] = ispkg
+        return _index_module_names(names)
+
+
+class ManifestDiscovery(object):
+    """A discovery backend for :func:`venusian.walk_packages` and
+    :meth:`venusian.Scanner.scan` which finds the modules listed in a
+    manifest: ``modules`` is an iterable of dotted module names.  The
+    names which other names in the manifest are nested under (including
+    parents missing from it) are considered packages.
+    """
+
+    def __init__(self, modules):
+        self.modules = modules
+
+    def index(self):
+        return _index_module_names(dict.fromkeys(self.modules, False))
+
+
+class RecordDiscovery(object):
+    """A discovery backend for :func:`venusian.walk_packages` and
+    :meth:`venusian.Scanner.scan` which finds the modules of packages
+    installed from wheels in the ``RECORD`` files of their distributions,
+    instead of listing the directories of the packages.
+
+    ``distributions`` is a sequence of the :mod:`importlib.metadata`
+    distributions (or distribution names) to look at; by default, those
+    providing the top-level package being scanned, according to
+    :func:`importlib.metadata.packages_distributions` (Python 3.10 and
+    later), which reads the metadata of every installed distribution, so
+    naming them is quicker.
+
+    A package's modules are only looked up in a ``RECORD`` if the directory
+    it records them in is on the package's ``__path__``; otherwise (as for
+    editable installs or source checkouts) they're listed by
+    :func:`pkgutil.iter_modules`.  The file of each module found in a
+    ``RECORD`` is checked to still exist as the module is listed, so that
+    modules deleted since the distribution was installed are left out.
+    """
+
+    def __init__(self, distributions=None):
+        self.distributions = distributions
+
+    def index(self):
+        # maps top-level package names to dictionaries mapping the prefixes
+        # of the packages recorded in their distributions to pairs of the
+        # directory of the package and the list of its modules, paired with
+        # the paths of their files
+        packages = {}
+
+        def find_modules(path=None, prefix=""):
+            top = prefix.partition(".")[0]
+            if path is None or not top:
+                return iter_modules(path, prefix)
+            recorded = packages.get(top)
+            if recorded is None:
+                recorded = packages[top] = self._record_packages(top)
+            package = recorded.get(prefix)
+            if package is not None:
+                directory, modules = package
+                if directory in map(os.path.abspath, path):
+                    return _existing_modules(modules)
+            return iter_modules(path, prefix)
+
+        return find_modules
+
+    def _record_packages(self, top):
+        from importlib import metadata
+        from importlib.machinery import EXTENSION_SUFFIXES
+
+        distributions = self.distributions
+        if distributions is None:
+            packages_distributions = getattr(metadata, "packages_distributions", None)
+            if packages_distributions is None:  # pragma: no cover
+                # Python < 3.10
+                return {}
+            distributions = packages_distributions().get(top, ())
+        packages = {}
+        for distribution in distributions:
+            if isinstance(distribution, str):
+                distribution = metadata.distribution(distribution)
+            record = distribution.read_text("RECORD")
+            if not record:
+                continue
+            root = str(distribution.locate_file(""))
+            for line in record.splitlines():
+                # RECORD is a CSV file, but its paths rarely need quoting;
+                # parsing it as such is much slower
+                if line.startswith('"'):
+                    import csv  # only needed for quoted paths
+
+                    line = next(csv.reader([line]))[0]
+                parts = line.partition(",")[0].split("/")
+                if parts[0] != top or "__pycache__" in parts:
+                    continue
+                filename = parts[-1]
+                if filename.endswith(".py"):
+                    stem = filename[:-3]
+                else:
+                    for suffix in EXTENSION_SUFFIXES:
+                        if filename.endswith(suffix):
+                            stem = filename[: -len(suffix)]
+                            break
+                    else:
+                        continue
+                if not stem.isidentifier():
+                    continue
+                parent = ".".join(parts[:-1]) + "."
+                filename = os.path.join(root, *parts)
+                if stem == "__init__":
+                    package = packages.setdefault(parent, [None, []])
+                    package[0] = os.path.abspath(os.path.dirname(filename))
+                    if len(parts) > 2:
+                        grandparent = ".".join(parts[:-2]) + "."
+                        module = ((None, parent[:-1], True), filename)
+                        packages.setdefault(grandparent, [None, []])[1].append(module)
+                else:
+                    module = ((None, parent + stem, False), filename)
+                    packages.setdefault(parent, [None, []])[1].append(module)
+        for package in packages.values():
+            package[1] = sorted(set(package[1]), key=lambda module: module[0][1])
+        return packages
+
+
+def _existing_modules(modules):
+    # the modules of a package found in a RECORD (paired with the paths of
+    # their files) whose files weren't deleted since it was written
+    for module, filename in modules:
+        if os.path.exists(filename):
+            yield module
+
+
+def _index_module_names(names):
+    # Return a function which, like iter_modules, lists the modules in
+    # names (a dictionary mapping dotted names to whether they're known to
+    # be packages) whose names are prefix followed by one more component.
+    names = dict(names)
+    for name in list(names):
+        parent = name.rpartition(".")[0]
+        while parent:
+            names[parent] = True
+            parent = parent.rpartition(".")[0]
+    children = {}
+    for name in sorted(names):
+        prefix = name[: name.rfind(".") + 1]
+        children.setdefault(prefix, []).append((None, name, names[name]))
+
+    def find_modules(path=None, prefix=""):
+        # path is irrelevant: names are looked up by prefix
+        return children.get(prefix, ())
+
+    return find_modules
+
+
 class lift(object):
     """
     A class decorator which 'lifts' superclass venusian configuration
@@ -486,39 +2193,146 @@ class lift(object):
                 '"lift" only works as a class decorator; you tried to use '
                 "it against %r" % wrapped
             )
+        # only the name of the calling module is needed here; it's the same
+        # one getFrameInfo would find, without reading the caller's source
         frame = sys._getframe(1)
-        scope, module, f_locals, f_globals, codeinfo = getFrameInfo(frame)
+        if _frozen is not None:
+            _frozen_change(_frame_codeinfo(frame))
+        f_globals = frame.f_globals
+        module = sys.modules.get(f_globals.get("__name__"))
         module_name = getattr(module, "__name__", None)
+        if _class_module(wrapped) != module_name:
+            _foreign_modules.add(module_name)
         newcategories = Categories(wrapped)
         newcategories.lifted = True
-        for cls in getmro(wrapped):
-            attached_categories = cls.__dict__.get(ATTACH_ATTR, None)
-            if attached_categories is None:
-                attached_categories = cls.__dict__.get(LIFTONLY_ATTR, None)
-            if attached_categories is not None:
-                for cname, category in attached_categories.items():
-                    if cls is not wrapped:
-                        if self.categories and not cname in self.categories:
-                            continue
-                    callbacks = newcategories.get(cname, [])
-                    newcallbacks = []
-                    for cb, _, liftid, cscope in category:
-                        append = True
-                        toappend = (cb, module_name, liftid, cscope)
-                        if cscope == "class":
-                            for ncb, _, nliftid, nscope in callbacks:
-                                if nscope == "class" and liftid == nliftid:
-                                    append = False
-                        if append:
-                            newcallbacks.append(toappend)
-                    newcategory = list(callbacks) + newcallbacks
-                    newcategories[cname] = newcategory
-                if attached_categories.lifted:
-                    break
+        newcategories.defined_in = _class_module(wrapped)
+        mro = getmro(wrapped)
+        attached_categories = _attached_categories(wrapped)
+        if attached_categories is not None and attached_categories.lifted:
+            inherited = {}
+        else:
+            inherited = self._merge_bases(mro[1:])
+        # the decorated class' own callbacks aren't subject to the category
+        # filter
+        merged = _merge_lifted(attached_categories, None, inherited, {})
+        for cname, node in merged.items():
+            newcategories[cname] = LiftedCallbacks(module_name, node)
         if newcategories:  # if it has any keys
             setattr(wrapped, ATTACH_ATTR, newcategories)
+            for cname in newcategories:
+                _index_category(module_name, cname)
+            _attachments_changed()
         return wrapped
 
+    def _merge_bases(self, classes):
+        # Merge the callbacks of ``classes``, a tail of the MRO of the class
+        # being lifted, stopping at the first already-lifted class.  The
+        # result for a tail which is itself the MRO of its first class is
+        # the same for every subclass lifted with the same categories, so
+        # it's cached per class.
+        if self.categories:
+            key = tuple(self.categories)
+        else:
+            key = None
+        all_attached = tuple(map(_attached_categories, classes))
+        all_versions = tuple(
+            None if attached is None else attached.version for attached in all_attached
+        )
+        pending = []
+        merged = {}
+        for i, cls in enumerate(classes):
+            attached = all_attached[i:]
+            versions = all_versions[i:]
+            cached = _lift_cache.get(cls, {}).get(key)
+            if (
+                cached is not None
+                and len(cached[0]) == len(attached)
+                and all(map(is_, cached[0], attached))
+                and cached[1] == versions
+            ):
+                # the categories attached to the classes haven't been
+                # replaced or changed in place since the merge was cached
+                merged = cached[2]
+                break
+            pending.append((i, cls, attached, versions))
+            if attached[0] is not None and attached[0].lifted:
+                break
+        for i, cls, attached, versions in reversed(pending):
+            memo = _lift_snapshots.setdefault(classes[i], {})
+            merged = _merge_lifted(attached[0], self.categories, merged, memo)
+            if classes[i:] == getmro(cls):
+                _lift_cache.setdefault(cls, {})[key] = (attached, versions, merged)
+        return merged
+
+
+def _attached_categories(cls):
+    attached = cls.__dict__.get(ATTACH_ATTR, None)
+    liftonly = cls.__dict__.get(LIFTONLY_ATTR, None)
+    if attached is None:
+        return liftonly
+    if liftonly is not None:
+        # some of the class' categories were consumed by a scan
+        combined = Categories(cls)
+        combined.attached_id = attached.attached_id
+        combined.lifted = attached.lifted
+        combined.defined_in = attached.defined_in
+        combined.update(liftonly)
+        for cname, callbacks in attached.items():
+            if cname in combined:
+                # some of the callbacks of the category were consumed
+                callbacks = list(combined[cname]) + list(callbacks)
+            combined[cname] = callbacks
+        return combined
+    return attached
+
+
+def _merge_lifted(attached_categories, categories, inherited, memo):
+    """Merge the callbacks of a class' ``attached_categories`` with the
+    ``inherited`` ones of the classes which follow it in the MRO.
+
+    Both ``inherited`` and the return value map a category name to a chain
+    node (see :class:`LiftedCallbacks`).  Inherited nodes are shared, not
+    copied, so this costs one node per category of the class.  ``memo``
+    holds the snapshots of the class' callback lists (see ``_lift_node``).
+    """
+    if attached_categories is None:
+        return inherited
+    merged = {}
+    for cname, category in attached_categories.items():
+        if categories and not cname in categories:
+            continue
+        merged[cname] = _lift_node(category, inherited.get(cname), memo)
+    for cname, node in inherited.items():
+        if cname not in merged:
+            merged[cname] = node
+    return merged
+
+
+def _lift_node(callbacks, parent, memo):
+    if isinstance(callbacks, LiftedCallbacks):
+        if not callbacks.extra:
+            # a lifted class' callbacks already end the chain
+            return callbacks.node
+        size = len(callbacks.extra)
+    elif isinstance(callbacks, tuple):
+        # frozen by ``freeze``
+        size = None
+    else:
+        size = len(callbacks)
+    if size is not None:
+        # Callbacks attached to the class later are appended to its list, and
+        # must not show up in the classes already lifted from it, so the node
+        # holds a snapshot, shared by the nodes of every lift from the class
+        # until the list grows.
+        snapshot = memo.get(id(callbacks))
+        if snapshot is None or snapshot[0] is not callbacks or snapshot[1] != size:
+            snapshot = memo[id(callbacks)] = (callbacks, size, tuple(callbacks))
+        callbacks = snapshot[2]
+    liftids = frozenset(
+        liftid for cb, _, liftid, scope in callbacks if scope == "class"
+    )
+    return (callbacks, liftids, parent)
+
 
 class onlyliftedfrom(object):
     """
@@ -566,6 +2380,243 @@ class onlyliftedfrom(object):
             # we either have no categories or our categories are defined
             # in a superclass
             return
-        delattr(wrapped, ATTACH_ATTR)
-        setattr(wrapped, LIFTONLY_ATTR, cats)
+        if _frozen is not None:
+            _frozen_change(_frame_codeinfo(sys._getframe(1)))
+        with _attach_lock(wrapped):
+            delattr(wrapped, ATTACH_ATTR)
+            setattr(wrapped, LIFTONLY_ATTR, cats)
+        _attachments_changed()
         return wrapped
+
+
+def freeze(package=None, gc_freeze=False, strict=False):
+    """Convert the callbacks attached to the objects of the already imported
+    ``package`` (a package or module object, including its submodules) or,
+    if ``package`` is ``None``, of all modules in ``sys.modules``, into
+    immutable tuples, and start watching for changes to attachments.
+
+    This is meant to be called once all scanning is done, before forking
+    worker processes, so that the memory holding the attachments stays
+    shared with the parent.  If ``gc_freeze`` is true, :func:`gc.freeze` is
+    called after a garbage collection, moving all objects tracked by the
+    garbage collector to its permanent generation so that collections in the
+    workers don't touch their memory.
+
+    Attaching callbacks, lifting or marking classes as only lifted from
+    after freezing, or scanning with ``consume``, still works (frozen
+    callbacks are copied on write), but the change is recorded and reported by
+    :func:`venusian.changes_since_freeze`; if ``strict`` is true, they
+    raise a :exc:`RuntimeError` instead.  :func:`venusian.thaw` stops
+    watching for changes.
+    """
+    global _frozen
+    memo = {}
+    for categories in _module_attachments(package):
+        for cname, callbacks in list(categories.items()):
+            categories[cname] = _freeze_callbacks(callbacks, memo)
+    # the lift caches would keep the unfrozen lists alive
+    _lift_cache.clear()
+    _lift_snapshots.clear()
+    if _frozen is None:
+        _frozen = (strict, [])
+    else:
+        _frozen = (strict, _frozen[1])
+    if gc_freeze:
+        gc.collect()
+        gc.freeze()
+
+
+def _module_attachments(package):
+    # Yield the Categories found in the ATTACH_ATTR and LIFTONLY_ATTR
+    # attributes of the objects in the namespace of the already imported
+    # package (and its submodules) or, if None, of all modules, once each.
+    if package is None:
+        modules = list(sys.modules.values())
+    else:
+        name = package.__name__
+        modules = [
+            module
+            for mod_name, module in list(sys.modules.items())
+            if mod_name == name or mod_name.startswith(name + ".")
+        ]
+    seen = set()
+    for module in modules:
+        namespace = getattr(module, "__dict__", None)
+        if not namespace:
+            continue
+        for ob in list(namespace.values()):
+            ob_dict = _own_dict(ob)
+            if ob_dict is None:
+                continue
+            for attr in (ATTACH_ATTR, LIFTONLY_ATTR):
+                categories = ob_dict.get(attr)
+                if isinstance(categories, Categories):
+                    if id(categories) not in seen:
+                        seen.add(id(categories))
+                        yield categories
+
+
+def attachment_stats(package=None):
+    """Describe the callbacks attached to the objects of the already
+    imported ``package`` (a package or module object, including its
+    submodules) or, if ``package`` is ``None``, of all modules in
+    ``sys.modules``.  Nothing is imported, and only the top-level objects of
+    each module are examined, like a scan would.
+
+    Return a dictionary with the following keys:
+
+    - ``objects``: the number of objects (or class statements) carrying
+      attached callbacks.
+
+    - ``callbacks``: the number of callbacks attached to them.
+
+    - ``modules``, ``categories`` and ``scopes``: dictionaries mapping the
+      names of the modules the decorations were made in, the callback
+      categories, and the scopes of the decorations (``'class'``,
+      ``'module'``, ...), respectively, to the number of callbacks.
+
+    - ``lifted``: the number of categories holding callbacks lifted by
+      :class:`venusian.lift`.
+
+    - ``bytes``: an approximation, from :func:`sys.getsizeof`, of the
+      memory retained by the attachments, counting shared containers once.
+      The callbacks themselves are counted, but not the objects they refer
+      to.
+    """
+    stats = {
+        "objects": 0,
+        "callbacks": 0,
+        "modules": {},
+        "categories": {},
+        "scopes": {},
+        "lifted": 0,
+        "bytes": 0,
+    }
+    modules = stats["modules"]
+    counts = stats["categories"]
+    scopes = stats["scopes"]
+    # ids of the (possibly shared) objects counted in nbytes so far
+    sized = set()
+    nbytes = 0
+    for categories in _module_attachments(package):
+        stats["objects"] += 1
+        nbytes += sys.getsizeof(categories)
+        for category, callbacks in list(categories.items()):
+            if isinstance(callbacks, LiftedCallbacks):
+                stats["lifted"] += 1
+            nbytes += _callbacks_size(callbacks, sized)
+            n = 0
+            for _, cb_mod_name, _, scope in callbacks:
+                modules[cb_mod_name] = modules.get(cb_mod_name, 0) + 1
+                scopes[scope] = scopes.get(scope, 0) + 1
+                n += 1
+            counts[category] = counts.get(category, 0) + n
+            stats["callbacks"] += n
+    stats["bytes"] = nbytes
+    return stats
+
+
+def _callbacks_size(callbacks, sized):
+    # The approximate size of a callback list or LiftedCallbacks, not
+    # counting the shareable objects whose ids are in sized (which are
+    # added to it).
+    if id(callbacks) in sized:
+        return 0
+    sized.add(id(callbacks))
+    getsizeof = sys.getsizeof
+    nbytes = getsizeof(callbacks)
+    if isinstance(callbacks, LiftedCallbacks):
+        node = callbacks.node
+        while node is not None:
+            if id(node) in sized:
+                # the rest of the chain is shared with another class
+                break
+            sized.add(id(node))
+            nbytes += getsizeof(node) + getsizeof(node[1])
+            nbytes += _callbacks_size(node[0], sized)
+            node = node[2]
+        if callbacks.extra is not None:
+            nbytes += _callbacks_size(callbacks.extra, sized)
+        return nbytes
+    for entry in callbacks:
+        nbytes += getsizeof(entry) + getsizeof(entry[2])
+        callback = entry[0]
+        if id(callback) not in sized:
+            # callbacks are often shared by many decorations
+            sized.add(id(callback))
+            nbytes += getsizeof(callback)
+    return nbytes
+
+
+def changes_since_freeze():
+    """Return a list of ``(filename, lineno, function, sourceline)`` tuples
+    describing the calls to ``attach``, ``lift`` or ``onlyliftedfrom``, and
+    to scans which consumed callbacks, made since :func:`venusian.freeze`
+    was called; empty if none were, or if attachments aren't frozen."""
+    if _frozen is None:
+        return []
+    return list(_frozen[1])
+
+
+def thaw():
+    """Stop watching for changes to attachments started by
+    :func:`venusian.freeze`.  Attachments stay immutable until changed."""
+    global _frozen
+    _frozen = None
+
+
+def _frozen_change(codeinfo):
+    strict, changes = _frozen
+    if strict:
+        raise RuntimeError(
+            "venusian attachments were changed after being frozen, at "
+            "%s:%s" % (codeinfo[0], codeinfo[1])
+        )
+    changes.append(codeinfo)
+
+
+def _frame_codeinfo(frame):
+    code = frame.f_code
+    return (code.co_filename, frame.f_lineno, code.co_name, None)
+
+
+def _caller_codeinfo():
+    # the codeinfo of the innermost frame outside of this module, such as
+    # the call to a scan
+    frame = sys._getframe(1)
+    while frame.f_globals is globals():
+        frame = frame.f_back
+    return _frame_codeinfo(frame)
+
+
+def _freeze_callbacks(callbacks, memo):
+    # Return an immutable version of ``callbacks``, a callback list or a
+    # LiftedCallbacks (frozen in place, with its chain nodes rebuilt around
+    # frozen callbacks).  ``memo`` maps the id of a list or node to a pair of
+    # it and its frozen version, so that shared lists stay shared.
+    if isinstance(callbacks, LiftedCallbacks):
+        callbacks.node = _freeze_node(callbacks.node, memo)
+        if callbacks.extra is not None:
+            callbacks.extra = tuple(callbacks.extra)
+        return callbacks
+    if isinstance(callbacks, tuple):
+        return callbacks
+    frozen = memo.get(id(callbacks))
+    if frozen is None:
+        frozen = memo[id(callbacks)] = (callbacks, tuple(callbacks))
+    return frozen[1]
+
+
+def _freeze_node(node, memo):
+    if node is None:
+        return None
+    frozen = memo.get(id(node))
+    if frozen is None:
+        callbacks, liftids, parent = node
+        frozen_node = (
+            _freeze_callbacks(callbacks, memo),
+            liftids,
+            _freeze_node(parent, memo),
+        )
+        frozen = memo[id(node)] = (node, frozen_node)
+    return frozen[1]
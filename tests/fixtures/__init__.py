@@ -30,3 +30,48 @@ class categorydecorator(decorator):
 
 class categorydecorator2(decorator):
     category = "mycategory2"
+
+
+class leandecorator(decorator):
+    infos = []
+
+    def __call__(self, wrapped):
+        view_config = self.__dict__.copy()
+
+        def callback(context, name, ob):
+            if hasattr(context, "test"):
+                context.test(ob=ob, name=name, **view_config)
+
+        info = venusian.attach(wrapped, callback, category=self.category, lean=True)
+        self.infos.append(info)
+        return wrapped
+
+
+def payloadhandler(context, name, ob, payload):
+    if hasattr(context, "test"):
+        context.test(ob=ob, name=name, **dict(payload))
+
+
+class payloaddecorator(decorator):
+    def __call__(self, wrapped):
+        payload = tuple(sorted(self.__dict__.items()))
+        venusian.attach(
+            wrapped, payloadhandler, category=self.category, payload=payload
+        )
+        return wrapped
+
+
+class methoddecorator(decorator):
+    def __call__(self, wrapped):
+        view_config = self.__dict__.copy()
+        view_config.setdefault("attr", wrapped.__name__)
+
+        def callback(context, name, ob):
+            if hasattr(context, "test"):
+                context.test(ob=ob, name=name, **view_config)
+
+        return venusian.attach_method(wrapped, callback, category=self.category)
+
+
+class categorymethoddecorator(methoddecorator):
+    category = "mycategory"
@@ -0,0 +1,35 @@
+from tests.fixtures import decorator, methoddecorator
+from venusian import lift, onlyliftedfrom
+
+
+class Class(object):
+    @methoddecorator(method=True)
+    def method(self):  # pragma: no cover
+        pass
+
+    @methoddecorator(outer=True)
+    @methoddecorator(inner=True)
+    def stacked(self):  # pragma: no cover
+        pass
+
+    @decorator(framed=True)
+    def framed(self):  # pragma: no cover
+        pass
+
+
+@onlyliftedfrom()
+class Base(object):
+    @methoddecorator(base=True)
+    def boo(self):  # pragma: no cover
+        pass
+
+    @methoddecorator(base=True)
+    def hiss(self):  # pragma: no cover
+        pass
+
+
+@lift()
+class Sub(Base):
+    @methoddecorator(sub=True)
+    def hiss(self):  # pragma: no cover
+        pass
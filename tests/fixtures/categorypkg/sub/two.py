@@ -0,0 +1,6 @@
+from tests.fixtures import categorydecorator2
+
+
+@categorydecorator2(function=True)
+def function2(request):  # pragma: no cover
+    return request
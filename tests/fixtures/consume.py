@@ -0,0 +1,25 @@
+from tests.fixtures import categorydecorator, categorydecorator2
+from venusian import lift
+
+
+@categorydecorator(function=True)
+@categorydecorator2(function=True)
+def function(request):  # pragma: no cover
+    return request
+
+
+class Class(object):
+    @categorydecorator(method=True)
+    def method(self):  # pragma: no cover
+        pass
+
+    @categorydecorator2(method=True)
+    def method2(self):  # pragma: no cover
+        pass
+
+
+@lift()
+class Lifted(Class):
+    @categorydecorator(method=True)
+    def method3(self):  # pragma: no cover
+        pass
@@ -0,0 +1,6 @@
+# decorates a function and a class defined in another module
+from tests.fixtures import decorator
+from tests.fixtures.foreign.origin import Class, function
+
+decorator(function=True)(function)
+decorator(class_=True)(Class)
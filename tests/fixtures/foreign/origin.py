@@ -0,0 +1,6 @@
+def function(request):  # pragma: no cover
+    return request
+
+
+class Class(object):
+    pass
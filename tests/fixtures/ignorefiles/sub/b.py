@@ -0,0 +1 @@
+raise ImportError("ignored by .venusianignore")
@@ -0,0 +1,26 @@
+from tests.fixtures import decorator
+
+loaded = []
+
+
+@decorator(function=True)
+def function(request):  # pragma: no cover
+    return request
+
+
+def __getattr__(name):
+    # PEP 562: define ``lazy`` on first access
+    if name != "lazy":
+        raise AttributeError(name)
+    loaded.append(name)
+
+    @decorator(function=True)
+    def lazy(request):  # pragma: no cover
+        return request
+
+    globals()["lazy"] = lazy
+    return lazy
+
+
+def __dir__():
+    return sorted(list(globals()) + ["lazy"])
@@ -0,0 +1,25 @@
+from tests.fixtures import leandecorator
+
+
+@leandecorator(function=True)
+def function(request):  # pragma: no cover
+    return request
+
+
+class Class(object):
+    @leandecorator(category="mycategory", method=True)
+    def method(self):  # pragma: no cover
+        pass
+
+
+def make_inner():
+    big = list(range(10))
+
+    @leandecorator(function=True)
+    def inner(request):  # pragma: no cover
+        return big
+
+    return inner
+
+
+inner = make_inner()
@@ -0,0 +1,11 @@
+import threading
+
+from tests.fixtures import decorator
+
+if threading.current_thread() is not threading.main_thread():
+    raise ImportError("only importable from the main thread")
+
+
+@decorator(function=True)
+def function(request):  # pragma: no cover
+    return request
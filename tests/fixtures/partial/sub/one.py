@@ -0,0 +1,6 @@
+from tests.fixtures import categorydecorator
+
+
+@categorydecorator(function=True)
+def function(request):  # pragma: no cover
+    return request
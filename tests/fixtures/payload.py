@@ -0,0 +1,17 @@
+from tests.fixtures import payloaddecorator
+
+
+@payloaddecorator(function=True)
+def function(request):  # pragma: no cover
+    return request
+
+
+@payloaddecorator(function=True, renderer="other")
+def function2(request):  # pragma: no cover
+    return request
+
+
+class Class(object):
+    @payloaddecorator(method=True)
+    def method(self):  # pragma: no cover
+        pass
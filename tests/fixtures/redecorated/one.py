@@ -0,0 +1,15 @@
+from tests.fixtures import categorydecorator, categorydecorator2
+
+
+@categorydecorator(function=True)
+@categorydecorator2(function=True)
+def function(request):  # pragma: no cover
+    return request
+
+
+alias = function
+
+
+@categorydecorator(klass=True)
+class Class(object):
+    pass
@@ -0,0 +1,6 @@
+from tests.fixtures import categorydecorator
+from tests.fixtures.redecorated.one import Class, function
+
+# the same category, attached by this module to objects imported from another
+function = categorydecorator(function=True)(function)
+Class = categorydecorator(klass=True)(Class)
@@ -0,0 +1 @@
+from tests.fixtures.rehomed._impl import Err, function  # noqa: F401
@@ -0,0 +1,25 @@
+from tests.fixtures import decorator
+
+
+def set_module(module):
+    # like numpy's, to document a function as part of the package's API
+    def decorator(function):
+        function.__module__ = module
+        return function
+
+    return decorator
+
+
+@set_module("tests.fixtures.rehomed")
+@decorator(function=True)
+def function(request):  # pragma: no cover
+    return request
+
+
+class Err(Exception):
+    @decorator(method=True)
+    def method(self):  # pragma: no cover
+        pass
+
+
+Err.__module__ = "tests.fixtures.rehomed"
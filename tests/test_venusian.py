@@ -162,6 +162,33 @@ class TestScanner(unittest.TestCase):
         self.assertEqual(test.registrations[2]["ob"], inst1)
         self.assertEqual(test.registrations[2]["instance"], True)
 
+    def test_payload(self):
+        from tests.fixtures import payload, payloadhandler
+        from venusian import ATTACH_ATTR, PayloadCallback
+
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(payload)
+        test.registrations.sort(key=lambda x: x["ob"].__name__)
+        self.assertEqual(
+            test.registrations,
+            [
+                dict(ob=payload.Class, name="Class", method=True),
+                dict(ob=payload.function, name="function", function=True),
+                dict(
+                    ob=payload.function2,
+                    name="function2",
+                    function=True,
+                    renderer="other",
+                ),
+            ],
+        )
+        callback = getattr(payload.function, ATTACH_ATTR)[None][0][0]
+        self.assertTrue(isinstance(callback, PayloadCallback))
+        self.assertTrue(callback.handler is payloadhandler)
+        self.assertEqual(callback.payload, (("function", True),))
+        self.assertTrue(repr(callback).startswith("<PayloadCallback <function"))
+
     def test_ignore_imported(self):
         # even though "twofunction" is imported into "one", it should not
         # be registered, because it's only imported in one and not defined
@@ -280,6 +307,373 @@ class TestScanner(unittest.TestCase):
             ],
         )
 
+    def test_import_budget_collect(self):
+        from tests.fixtures import categorypkg
+        from venusian import ImportBudgetExceeded
+
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        reports = scanner.scan(categorypkg, import_budget=0, over_budget="collect")
+        self.assertEqual(
+            [(r.name, r.parent) for r in reports],
+            [
+                ("tests.fixtures.categorypkg.one", "tests.fixtures.categorypkg"),
+                ("tests.fixtures.categorypkg.sub", "tests.fixtures.categorypkg"),
+                (
+                    "tests.fixtures.categorypkg.sub.two",
+                    "tests.fixtures.categorypkg.sub",
+                ),
+            ],
+        )
+        self.assertTrue(isinstance(reports[0], ImportBudgetExceeded))
+        self.assertTrue(reports[0].seconds > reports[0].budget == 0)
+        self.assertTrue(str(reports[0]).startswith("importing " + reports[0].name))
+        self.assertEqual(len(test.registrations), 2)
+        self.assertEqual(scanner.scan(categorypkg, over_budget="collect"), [])
+
+    def test_import_budget_warn(self):
+        import warnings
+
+        from tests.fixtures import categorypkg
+        from venusian import ImportBudgetWarning
+
+        scanner = self._makeOne(test=_Test())
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            self.assertEqual(scanner.scan(categorypkg, import_budget=0), None)
+            scanner.scan(categorypkg, import_budget=60)
+        self.assertEqual(len(caught), 3)
+        self.assertTrue(issubclass(caught[0].category, ImportBudgetWarning))
+        self.assertTrue("tests.fixtures.categorypkg.one" in str(caught[0].message))
+
+    def test_import_budget_raise(self):
+        from tests.fixtures import categorypkg
+        from venusian import ImportBudgetExceeded
+
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        errors = []
+        with self.assertRaises(ImportBudgetExceeded) as cm:
+            scanner.scan(
+                categorypkg,
+                onerror=errors.append,
+                import_budget=0,
+                over_budget="raise",
+            )
+        self.assertEqual(cm.exception.name, "tests.fixtures.categorypkg.one")
+        self.assertEqual(errors, [])
+        self.assertEqual(test.registrations, [])
+        with self.assertRaises(ImportBudgetExceeded) as cm:
+            scanner.scan(
+                categorypkg,
+                ignore=".one",
+                import_budget=0,
+                over_budget="raise",
+            )
+        self.assertEqual(cm.exception.name, "tests.fixtures.categorypkg.sub")
+
+    def test_import_budget_unknown_policy(self):
+        from tests.fixtures import categorypkg
+
+        scanner = self._makeOne(test=_Test())
+        self.assertRaises(ValueError, scanner.scan, categorypkg, over_budget="log")
+
+    def _threaded_modules(self):
+        # forget the fixture modules so that they're imported by the scan
+        names = [
+            "tests.fixtures.threaded.a",
+            "tests.fixtures.threaded.b",
+            "tests.fixtures.threaded.sub",
+            "tests.fixtures.threaded.sub.c",
+        ]
+        for name in names:
+            md(name)
+        return names
+
+    def test_import_workers(self):
+        from tests.fixtures import threaded
+
+        names = self._threaded_modules()
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(threaded)
+        expected = [r["ob"].__module__ for r in test.registrations]
+        self.assertEqual(expected, ["tests.fixtures.threaded"] + names)
+        self._threaded_modules()
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(threaded, import_workers=4)
+        self.assertEqual([r["ob"].__module__ for r in test.registrations], expected)
+
+    def test_import_workers_ignore_and_budget(self):
+        from tests.fixtures import threaded
+
+        self._threaded_modules()
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        reports = scanner.scan(
+            threaded,
+            ignore=".sub",
+            import_workers=4,
+            import_budget=0,
+            over_budget="collect",
+        )
+        self.assertEqual(
+            [r.name for r in reports],
+            ["tests.fixtures.threaded.a", "tests.fixtures.threaded.b"],
+        )
+        self.assertFalse("tests.fixtures.threaded.sub" in sys.modules)
+        self.assertEqual(len(test.registrations), 3)
+
+    def test_import_workers_onerror(self):
+        from tests.fixtures import importerror_package
+
+        md("tests.fixtures.importerror_package.will_cause_import_error")
+        errors = []
+        scanner = self._makeOne(test=_Test())
+        scanner.scan(importerror_package, onerror=errors.append, import_workers=2)
+        self.assertEqual(
+            errors, ["tests.fixtures.importerror_package.will_cause_import_error"]
+        )
+
+    def test_modules(self):
+        from tests.fixtures import threaded
+
+        self._threaded_modules()
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(
+            threaded,
+            modules=["tests.fixtures.threaded.sub.c", "tests.fixtures.threaded.a"],
+        )
+        self.assertEqual(
+            [r["ob"].__module__ for r in test.registrations],
+            ["tests.fixtures.threaded.a", "tests.fixtures.threaded.sub.c"],
+        )
+        # parent packages are imported, but not scanned
+        self.assertTrue("tests.fixtures.threaded.sub" in sys.modules)
+        self.assertFalse("tests.fixtures.threaded.b" in sys.modules)
+
+    def test_modules_paths(self):
+        import pathlib
+
+        from tests.fixtures import threaded
+
+        self._threaded_modules()
+        directory = os.path.dirname(threaded.__file__)
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(
+            threaded,
+            modules=[
+                os.path.join(directory, "sub", "c.py"),
+                pathlib.Path(directory, "__init__.py"),
+                os.path.join(directory, "deleted.py"),
+                os.path.join(directory, "sub"),
+                os.path.join(os.path.dirname(directory), "zipped.zip"),
+                __file__,
+                os.path.join(os.path.dirname(directory), "__init__.py"),
+            ],
+        )
+        self.assertEqual(
+            [r["ob"].__module__ for r in test.registrations],
+            ["tests.fixtures.threaded", "tests.fixtures.threaded.sub.c"],
+        )
+
+    def test_modules_relative_paths(self):
+        from tests.fixtures import threaded
+
+        self._threaded_modules()
+        directory = os.path.dirname(threaded.__file__)
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        cwd = os.getcwd()
+        try:
+            # file names without a directory aren't dotted names
+            os.chdir(directory)
+            scanner.scan(threaded, modules=["a.py", "deleted.py"])
+            os.chdir(os.path.dirname(directory))
+            scanner.scan(threaded, modules=["zipped.zip"])
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(
+            [r["ob"].__module__ for r in test.registrations],
+            ["tests.fixtures.threaded.a"],
+        )
+
+    def test_modules_ignore_and_onerror(self):
+        from tests.fixtures import importerror_package, threaded
+
+        self._threaded_modules()
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(
+            threaded,
+            ignore=".sub",
+            modules=[
+                "tests.fixtures.threaded.b",
+                "tests.fixtures.threaded.sub",
+                "tests.fixtures.threaded.sub.c",
+            ],
+        )
+        self.assertEqual(
+            [r["ob"].__module__ for r in test.registrations],
+            ["tests.fixtures.threaded.b"],
+        )
+        self.assertFalse("tests.fixtures.threaded.sub" in sys.modules)
+        name = "tests.fixtures.importerror_package.will_cause_import_error"
+        md(name)
+        errors = []
+        scanner.scan(importerror_package, onerror=errors.append, modules=[name])
+        self.assertEqual(errors, [name])
+
+    def test_modules_not_in_package(self):
+        from tests.fixtures import threaded
+
+        scanner = self._makeOne()
+        self.assertRaises(
+            ValueError,
+            scanner.scan,
+            threaded,
+            modules=["tests.fixtures.threadedness"],
+        )
+
+    def test_ignore_files(self):
+        from tests.fixtures import ignorefiles
+
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(ignorefiles, ignore_files=True, import_workers=2)
+        self.assertEqual(
+            [r["ob"].__module__ for r in test.registrations],
+            [
+                "tests.fixtures.ignorefiles",
+                "tests.fixtures.ignorefiles.a",
+                "tests.fixtures.ignorefiles.sub",
+                "tests.fixtures.ignorefiles.sub.c",
+            ],
+        )
+
+    def test_members_not_probed(self):
+        import types
+
+        import venusian
+
+        resolved = []
+        orig_resolve = venusian._resolve_callbacks
+
+        def resolve(mod_name, name, ob):
+            resolved.append(name)
+            return orig_resolve(mod_name, name, ob)
+
+        module = types.ModuleType("venusian_prefiltered")
+        module.Imported = type("Imported", (object,), {})
+        module.Local = type("Local", (object,), {"__module__": module.__name__})
+        module.number = 1
+        module.text = "text"
+        module.types = types
+        module.function = lambda: None
+        scanner = self._makeOne()
+        venusian._resolve_callbacks = resolve
+        try:
+            scanner.scan(module)
+        finally:
+            venusian._resolve_callbacks = orig_resolve
+        # only the class defined in the module was looked at
+        self.assertEqual(resolved, ["Local"])
+
+    def test_attachments_looked_up_statically(self):
+        import functools
+        import types
+
+        from tests.fixtures.import_and_scan.mock import _Call
+        from venusian import ATTACH_ATTR
+
+        probed = []
+
+        class Meta(type):
+            def __getattr__(cls, name):
+                probed.append(name)
+                raise AttributeError(name)
+
+        class Proxy(object):
+            def __getattr__(self, name):
+                probed.append(name)
+                return _Call(name=name)
+
+        class Slotted(object):
+            __slots__ = ()
+
+        class NotADict(object):
+            __dict__ = ()
+
+        module = types.ModuleType("venusian_static")
+        module.Class = Meta("Class", (object,), {"__module__": module.__name__})
+        module.proxy = Proxy()
+        module.slotted = Slotted()
+        module.not_a_dict = NotADict()
+        # the attachments of the wrapped function are copied to the wrapper
+        from tests.fixtures.one.module import function
+
+        module.wrapper = functools.wraps(function)(lambda request: None)
+        module.wrapper.__module__ = module.__name__
+        # values which aren't Categories stored under ATTACH_ATTR
+        for name, attached in [("broken", object()), ("unsortable", _Call())]:
+            function = types.FunctionType(
+                (lambda: None).__code__, {"__name__": module.__name__}, name
+            )
+            function.__dict__[ATTACH_ATTR] = attached
+            setattr(module, name, function)
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(module)
+        self.assertEqual(probed, [])
+        self.assertEqual(test.registrations, [])
+
+    def test_foreign_module(self):
+        import venusian
+        from tests.fixtures import foreign
+
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(foreign)
+        self.assertTrue("tests.fixtures.foreign" in venusian._foreign_modules)
+        self.assertEqual(
+            sorted(r["name"] for r in test.registrations), ["Class", "function"]
+        )
+        for registration in test.registrations:
+            self.assertEqual(
+                registration["ob"].__module__, "tests.fixtures.foreign.origin"
+            )
+
+    def test_rehomed(self):
+        # the __module__ of decorated objects changed after decorating them
+        from tests.fixtures import rehomed
+
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(rehomed)
+        self.assertEqual(
+            sorted(r["name"] for r in test.registrations), ["Err", "function"]
+        )
+        for registration in test.registrations:
+            self.assertEqual(registration["ob"].__module__, "tests.fixtures.rehomed")
+
+    def test_lazy_attributes(self):
+        md("tests.fixtures.lazy")
+        from tests.fixtures import lazy
+
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(lazy)
+        self.assertEqual([r["name"] for r in test.registrations], ["function"])
+        self.assertEqual(lazy.loaded, [])
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(lazy, lazy_attributes=True)
+        self.assertEqual(lazy.loaded, ["lazy"])
+        self.assertEqual([r["name"] for r in test.registrations], ["function", "lazy"])
+
     def test_importerror_during_scan_default_onerror(self):
         from tests.fixtures import importerror
 
@@ -935,6 +1329,847 @@ class TestScanner(unittest.TestCase):
         self.assertEqual(test.registrations[1]["name"], "Super")
         self.assertEqual(test.registrations[1]["ob"], subclassing.Super)
 
+    def test_category_filter_skips_modules_without_matching_category(self):
+        import venusian
+        from tests.fixtures import categorypkg
+
+        enumerated = []
+        orig_module_members = venusian._module_members
+
+        def module_members(module, lazy_attributes=False):
+            enumerated.append(module.__name__)
+            return orig_module_members(module, lazy_attributes)
+
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        venusian._module_members = module_members
+        try:
+            scanner.scan(categorypkg, categories=("mycategory",))
+        finally:
+            venusian._module_members = orig_module_members
+        self.assertEqual(len(test.registrations), 1)
+        self.assertEqual(test.registrations[0]["name"], "function")
+        self.assertEqual(enumerated, ["tests.fixtures.categorypkg.one"])
+
+    def test_category_filter_skips_complete_subpackages(self):
+        import venusian
+        from tests.fixtures import categorypkg
+
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(categorypkg)
+        self.assertEqual(len(test.registrations), 2)
+        self.assertTrue("tests.fixtures.categorypkg" in venusian._complete_packages)
+        self.assertTrue("tests.fixtures.categorypkg.sub" in venusian._complete_packages)
+
+        walked = []
+
+        def ignore(name):
+            walked.append(name)
+            return False
+
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(categorypkg, categories=("mycategory",), ignore=ignore)
+        self.assertEqual(len(test.registrations), 1)
+        self.assertFalse("tests.fixtures.categorypkg.sub.two" in walked)
+
+        walked[:] = []
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(categorypkg, categories=("mycategory2",), ignore=ignore)
+        self.assertEqual(len(test.registrations), 1)
+        self.assertEqual(test.registrations[0]["name"], "function2")
+        self.assertTrue("tests.fixtures.categorypkg.sub.two" in walked)
+
+    def test_category_filter_ignored_subpackage_is_not_complete(self):
+        import venusian
+        from tests.fixtures import nested
+
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(nested, ignore=".sub1.subsub1")
+        self.assertFalse("tests.fixtures.nested" in venusian._complete_packages)
+        self.assertFalse("tests.fixtures.nested.sub1" in venusian._complete_packages)
+        self.assertTrue("tests.fixtures.nested.sub2" in venusian._complete_packages)
+
+    def _partial(self):
+        # tests.fixtures.partial, neither imported nor indexed
+        import importlib
+
+        import venusian
+
+        for name in [
+            "tests.fixtures.partial.sub.hidden",
+            "tests.fixtures.partial.sub.one",
+            "tests.fixtures.partial.sub",
+            "tests.fixtures.partial",
+        ]:
+            md(name)
+            venusian._module_categories.pop(name, None)
+            venusian._subtree_categories.pop(name, None)
+            venusian._complete_packages.discard(name)
+        return importlib.import_module("tests.fixtures.partial")
+
+    def test_category_filter_after_discovery(self):
+        from venusian import ManifestDiscovery
+
+        partial = self._partial()
+        discovery = ManifestDiscovery(["tests.fixtures.partial.sub.one"])
+        test = _Test()
+        self._makeOne(test=test).scan(partial, discovery=discovery)
+        self.assertEqual(len(test.registrations), 1)
+        # the modules the backend didn't list weren't imported
+        test = _Test()
+        self._makeOne(test=test).scan(partial, categories=("mycategory2",))
+        self.assertEqual(len(test.registrations), 1)
+        self.assertEqual(test.registrations[0]["name"], "function2")
+
+    def test_category_filter_after_ignore_files(self):
+        partial = self._partial()
+        test = _Test()
+        self._makeOne(test=test).scan(partial, ignore_files=True)
+        self.assertEqual(len(test.registrations), 1)
+        # the modules hidden by .venusianignore weren't imported
+        test = _Test()
+        self._makeOne(test=test).scan(partial, categories=("mycategory2",))
+        self.assertEqual(len(test.registrations), 1)
+        self.assertEqual(test.registrations[0]["name"], "function2")
+
+    def test_category_filter_lifted(self):
+        from tests.fixtures import lifting1
+
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(lifting1, categories=(None,))
+        self.assertEqual(len(test.registrations), 11)
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        scanner.scan(lifting1, categories=("mycategory",))
+        self.assertEqual(len(test.registrations), 0)
+
+    def test_repeated_scan_uses_cached_callbacks(self):
+        import venusian
+        from tests.fixtures import category
+
+        resolved = []
+        orig_resolve = venusian._resolve_callbacks
+
+        def resolve(mod_name, name, ob):
+            resolved.append(name)
+            return orig_resolve(mod_name, name, ob)
+
+        test = _Test()
+        scanner = self._makeOne(test=test)
+        venusian._resolve_callbacks = resolve
+        try:
+            scanner.scan(category)
+            self.assertTrue("function" in resolved)
+            resolved[:] = []
+            scanner.scan(category)
+            self.assertFalse("function" in resolved)
+            scanner.scan(category, categories=("mycategory2",))
+            self.assertFalse("function2" in resolved)
+            # attaching anything invalidates the cache
+            venusian._attachments_changed()
+            scanner.scan(category)
+            self.assertTrue("function" in resolved)
+        finally:
+            venusian._resolve_callbacks = orig_resolve
+        self.assertEqual(len(test.registrations), 7)
+        self.assertEqual(test.registrations[4]["name"], "function2")
+
+    def test_unhashable_scanner(self):
+        from tests.fixtures import category
+        from venusian import Scanner
+
+        class UnhashableScanner(Scanner):
+            __hash__ = None
+
+        test = _Test()
+        scanner = UnhashableScanner(test=test)
+        scanner.scan(category)
+        self.assertEqual(len(test.registrations), 2)
+        self.assertEqual(sorted(vars(scanner)), ["test"])
+
+    def test_cached_callbacks_dropped_when_object_dies(self):
+        import gc
+        import types
+
+        from tests.fixtures import decorator
+
+        module = types.ModuleType("venusian_test_dynamic")
+        module.decorator = decorator
+        module.number = 1
+        sys.modules[module.__name__] = module
+        try:
+            exec(
+                "@decorator(function=True)\ndef function(request): pass\n",
+                module.__dict__,
+            )
+            function = module.function
+            test = _Test()
+            scanner = self._makeOne(test=test)
+            scanner.scan(module)
+            self.assertEqual(len(test.registrations), 1)
+            from venusian import _resolved_caches
+
+            self.assertFalse("_venusian_resolved" in vars(scanner))
+            cache = _resolved_caches[scanner]
+            key = (module.__name__, "function", id(function))
+            self.assertTrue(key in cache)
+            # non-weakrefable objects aren't cached
+            self.assertFalse((module.__name__, "number", id(1)) in cache)
+            del module.function, function, test.registrations[:]
+            gc.collect()
+            self.assertFalse(key in cache)
+        finally:
+            del sys.modules[module.__name__]
+
+
+class Test_multiscan(unittest.TestCase):
+    def _callFUT(self, package, scans, **kw):
+        from venusian import multiscan
+
+        return multiscan(package, scans, **kw)
+
+    def _makeScanner(self, **kw):
+        from venusian import Scanner
+
+        return Scanner(**kw)
+
+    def test_single_traversal(self):
+        import venusian
+        from tests.fixtures import categorypkg
+
+        enumerated = []
+        orig_module_members = venusian._module_members
+
+        def module_members(module, lazy_attributes=False):
+            enumerated.append(module.__name__)
+            return orig_module_members(module, lazy_attributes)
+
+        test1 = _Test()
+        test2 = _Test()
+        test3 = _Test()
+        venusian._module_members = module_members
+        try:
+            self._callFUT(
+                categorypkg,
+                [
+                    (self._makeScanner(test=test1), {"categories": ["mycategory"]}),
+                    (self._makeScanner(test=test2), {"categories": ["mycategory2"]}),
+                    (self._makeScanner(test=test3), {}),
+                ],
+            )
+        finally:
+            venusian._module_members = orig_module_members
+        # each module's members are enumerated once for all the scanners
+        self.assertEqual(
+            sorted(enumerated),
+            [
+                "tests.fixtures.categorypkg",
+                "tests.fixtures.categorypkg.one",
+                "tests.fixtures.categorypkg.sub",
+                "tests.fixtures.categorypkg.sub.two",
+            ],
+        )
+        self.assertEqual([r["name"] for r in test1.registrations], ["function"])
+        self.assertEqual([r["name"] for r in test2.registrations], ["function2"])
+        self.assertEqual(
+            sorted(r["name"] for r in test3.registrations), ["function", "function2"]
+        )
+
+    def test_ignore_per_scanner(self):
+        from tests.fixtures import one
+
+        test1 = _Test()
+        test2 = _Test()
+        ignored = "tests.fixtures.one.module2"
+        self._callFUT(
+            one,
+            [
+                (self._makeScanner(test=test1), {"ignore": [ignored.__eq__]}),
+                (self._makeScanner(test=test2), {"ignore": [ignored[:-1].__eq__]}),
+            ],
+        )
+        self.assertEqual(len(test1.registrations), 3)
+        for registration in test1.registrations:
+            self.assertEqual(registration["ob"].__module__, ignored[:-1])
+        self.assertEqual(len(test2.registrations), 3)
+        for registration in test2.registrations:
+            self.assertEqual(registration["ob"].__module__, ignored)
+
+    def test_ignore_object_per_scanner(self):
+        from tests.fixtures import one
+
+        test1 = _Test()
+        test2 = _Test()
+        ignored = "tests.fixtures.one.module.function"
+        self._callFUT(
+            one,
+            [
+                (self._makeScanner(test=test1), {"ignore": [ignored.__eq__]}),
+                (self._makeScanner(test=test2), {}),
+            ],
+        )
+        self.assertEqual(len(test1.registrations), 5)
+        self.assertEqual(len(test2.registrations), 6)
+
+    def test_onerror(self):
+        from tests.fixtures import importerror
+
+        test = _Test()
+        errors = []
+        self._callFUT(
+            importerror, [(self._makeScanner(test=test), {})], onerror=errors.append
+        )
+        self.assertEqual(errors, ["tests.fixtures.importerror.will_cause_import_error"])
+        self.assertEqual(len(test.registrations), 1)
+
+
+class Test_walk_packages(unittest.TestCase):
+    def _callFUT(self, *arg, **kw):
+        from venusian import walk_packages
+
+        return walk_packages(*arg, **kw)
+
+    def test_importerror_no_onerror(self):
+        from tests.fixtures import importerror_package
+
+        results = self._callFUT(
+            importerror_package.__path__, importerror_package.__name__ + "."
+        )
+        self.assertRaises(ImportError, list, results)
+
+    def test_ignore_files(self):
+        from tests.fixtures import ignorefiles
+
+        results = self._callFUT(
+            ignorefiles.__path__, ignorefiles.__name__ + ".", ignore_files=True
+        )
+        self.assertEqual(
+            [name for importer, name, ispkg in results],
+            [
+                "tests.fixtures.ignorefiles.a",
+                "tests.fixtures.ignorefiles.sub",
+                "tests.fixtures.ignorefiles.sub.c",
+            ],
+        )
+        # without ignore files
+        from tests.fixtures import one
+
+        results = self._callFUT(one.__path__, one.__name__ + ".", ignore_files=True)
+        self.assertEqual(len(list(results)), 2)
+
+    def test_ignore_files_disabled(self):
+        from tests.fixtures import ignorefiles
+
+        errors = []
+        results = self._callFUT(
+            ignorefiles.__path__, ignorefiles.__name__ + ".", onerror=errors.append
+        )
+        self.assertEqual(len(list(results)), 7)
+        self.assertEqual(
+            errors,
+            [
+                "tests.fixtures.ignorefiles.sub.tests",
+                "tests.fixtures.ignorefiles.tests",
+            ],
+        )
+
+    def test_ignore_files_discovery(self):
+        from tests.fixtures import ignorefiles
+        from venusian import ManifestDiscovery
+
+        discovery = ManifestDiscovery(
+            ["tests.fixtures.ignorefiles.a", "tests.fixtures.ignorefiles.test_a"]
+        )
+        results = self._callFUT(
+            ignorefiles.__path__,
+            ignorefiles.__name__ + ".",
+            discovery=discovery,
+            ignore_files=True,
+        )
+        self.assertEqual(
+            [name for importer, name, ispkg in results],
+            ["tests.fixtures.ignorefiles.a"],
+        )
+
+
+class Test_index_category(unittest.TestCase):
+    def _callFUT(self, module_name, category):
+        from venusian import _index_category
+
+        return _index_category(module_name, category)
+
+    def test_no_module_name(self):
+        from venusian import _subtree_categories
+
+        before = dict(_subtree_categories)
+        self._callFUT(None, "cat")
+        self.assertEqual(_subtree_categories, before)
+
+    def test_prefixes(self):
+        from venusian import _module_categories, _subtree_categories
+
+        self._callFUT("venusian_test_a.b", "cat")
+        self.assertEqual(_module_categories["venusian_test_a.b"], {"cat"})
+        self.assertEqual(_subtree_categories["venusian_test_a"], {"cat"})
+        self.assertEqual(_subtree_categories["venusian_test_a.b"], {"cat"})
+        self.assertFalse("venusian_test_a" in _module_categories)
+
+
+class TestLeanAttachInfo(unittest.TestCase):
+    def setUp(self):
+        from tests.fixtures import leandecorator
+
+        leandecorator.infos[:] = []
+        md("tests.fixtures.lean")
+
+    def tearDown(self):
+        md("tests.fixtures.lean")
+
+    def test_released_after_scan(self):
+        from tests.fixtures import lean, leandecorator
+        from venusian import LeanAttachInfo, Scanner
+
+        function_info, method_info, inner_info = leandecorator.infos
+        self.assertTrue(isinstance(function_info, LeanAttachInfo))
+        self.assertEqual(function_info.scope, "module")
+        self.assertTrue(function_info.module is lean)
+        self.assertTrue(function_info.globals is lean.__dict__)
+        self.assertTrue(function_info.locals is lean.__dict__)
+        self.assertEqual(method_info.scope, "class")
+        self.assertEqual(method_info.category, "mycategory")
+        self.assertTrue("method" in method_info.locals)
+        self.assertEqual(inner_info.scope, "function call")
+        self.assertEqual(inner_info.locals["big"], list(range(10)))
+        self.assertEqual(inner_info.codeinfo[2], "make_inner")
+
+        test = _Test()
+        Scanner(test=test).scan(lean, categories=("mycategory",))
+        self.assertEqual(len(test.registrations), 1)
+        self.assertEqual(method_info.locals, None)
+        # other categories' callbacks haven't been run yet
+        self.assertEqual(inner_info.locals["big"], list(range(10)))
+
+        Scanner(test=test).scan(lean)
+        self.assertEqual(len(test.registrations), 4)
+        self.assertEqual(inner_info.locals, None)
+        self.assertTrue(inner_info.globals is lean.__dict__)
+        self.assertTrue(function_info.locals is lean.__dict__)
+
+    def test_dead_module(self):
+        from venusian import LeanAttachInfo
+
+        class Module(object):
+            pass
+
+        module = Module()
+        info = LeanAttachInfo("exec", module, {}, {}, None, None)
+        del module
+        self.assertEqual(info.module, None)
+        self.assertEqual(info.globals, {})
+        info.release()
+        self.assertEqual(info.globals, None)
+        self.assertEqual(info.locals, None)
+
+    def test_dead_info(self):
+        import venusian
+
+        venusian._lean_infos["venusian_test_lean"] = [
+            lambda: None,
+            lambda: info,
+        ]
+        info = venusian.LeanAttachInfo("class", None, {"a": 1}, {}, "mycategory", None)
+        venusian._release_attach_infos("venusian_test_lean", ("other",))
+        self.assertEqual(info.locals, {"a": 1})
+        self.assertEqual(len(venusian._lean_infos["venusian_test_lean"]), 1)
+        venusian._release_attach_infos("venusian_test_lean", None)
+        self.assertEqual(info.locals, None)
+        self.assertFalse("venusian_test_lean" in venusian._lean_infos)
+
+    def test_global_default(self):
+        import venusian
+        from tests.fixtures import decorator
+
+        def function():  # pragma: no cover
+            pass
+
+        venusian.LEAN_ATTACH_INFO = True
+        try:
+            info = venusian.attach(function, None)
+        finally:
+            venusian.LEAN_ATTACH_INFO = False
+        self.assertTrue(isinstance(info, venusian.LeanAttachInfo))
+        info = venusian.attach(function, None)
+        self.assertFalse(isinstance(info, venusian.LeanAttachInfo))
+
+
+class TestCategories(unittest.TestCase):
+    def _makeOne(self, attached_to):
+        from venusian import Categories
+
+        return Categories(attached_to)
+
+    def test_attached_to_weakrefable(self):
+        import gc
+
+        class Dummy(object):
+            pass
+
+        ob = Dummy()
+        inst = self._makeOne(ob)
+        self.assertTrue(inst.attached_to("mod", "name", ob))
+        self.assertFalse(inst.attached_to("mod", "name", Dummy()))
+        del ob
+        gc.collect()
+        self.assertFalse(inst.attached_to("mod", "name", None))
+
+    def test_attached_to_not_weakrefable(self):
+        class Dummy(object):
+            __slots__ = ("__dict__",)
+
+        ob = Dummy()
+        inst = self._makeOne(ob)
+        self.assertEqual(inst.attached_id, id(ob))
+        self.assertTrue(inst.attached_to("mod", "name", ob))
+        self.assertFalse(inst.attached_to("mod", "name", Dummy()))
+
+    def test_attached_to_name(self):
+        inst = self._makeOne(("mod", "name"))
+        self.assertTrue(inst.attached_to("mod", "name", None))
+        self.assertFalse(inst.attached_to("mod", "other", None))
+
+
+class Test_freeze(unittest.TestCase):
+    def tearDown(self):
+        from venusian import thaw
+
+        thaw()
+        md("venusian_test_frozen")
+
+    def _makeModule(self, **kw):
+        import types
+
+        module = types.ModuleType("venusian_test_frozen")
+        module.__dict__.update(kw)
+        sys.modules[module.__name__] = module
+        return module
+
+    def _callFUT(self, *arg, **kw):
+        from venusian import freeze
+
+        return freeze(*arg, **kw)
+
+    def test_package(self):
+        from tests.fixtures import lifting5
+        from venusian import ATTACH_ATTR, changes_since_freeze
+
+        self._callFUT(lifting5)
+        super1 = getattr(lifting5.Super1, ATTACH_ATTR)[None]
+        self.assertTrue(isinstance(super1, tuple))
+        lifted = getattr(lifting5.Sub, ATTACH_ATTR)[None]
+        self.assertTrue(isinstance(lifted.node[0], tuple))
+        super2 = getattr(lifting5.Super2, ATTACH_ATTR)[None]
+        self.assertTrue(lifted.node[2] is super2.node)
+        self.assertEqual(len(lifted), 6)
+        test = _Test()
+        scanner = TestScanner._makeOne(None, test=test)
+        scanner.scan(lifting5)
+        self.assertEqual(len(test.registrations), 15)
+        self.assertEqual(changes_since_freeze(), [])
+
+    def test_all_modules(self):
+        from tests.fixtures import category
+        from venusian import ATTACH_ATTR
+
+        # sys.modules may hold None to block imports
+        sys.modules["venusian_test_frozen"] = None
+        self._callFUT()
+        callbacks = getattr(category.function, ATTACH_ATTR)["mycategory"]
+        self.assertTrue(isinstance(callbacks, tuple))
+
+    def test_changes_recorded(self):
+        from tests.fixtures import decorator
+        from venusian import ATTACH_ATTR, changes_since_freeze, lift, thaw
+
+        @decorator()
+        def function():  # pragma: no cover
+            pass
+
+        class Super(object):
+            @decorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+        self._callFUT(self._makeModule(function=function, Super=Super))
+        self.assertEqual(changes_since_freeze(), [])
+        self.assertTrue(isinstance(getattr(function, ATTACH_ATTR)[None], tuple))
+        decorator()(function)
+        # copied on write
+        self.assertEqual(len(getattr(function, ATTACH_ATTR)[None]), 2)
+
+        class Sub(Super):
+            pass
+
+        lift()(Sub)
+        changes = changes_since_freeze()
+        self.assertEqual(len(changes), 2)
+        self.assertEqual(changes[0][2], "test_changes_recorded")
+        self.assertEqual(changes[1][2], "test_changes_recorded")
+        self.assertEqual(changes[1][3], None)
+        # freezing again keeps the changes
+        self._callFUT(self._makeModule())
+        self.assertEqual(len(changes_since_freeze()), 2)
+        thaw()
+        self.assertEqual(changes_since_freeze(), [])
+
+    def test_lifted_append_after_freeze(self):
+        from tests.fixtures import decorator
+        from venusian import ATTACH_ATTR, lift
+
+        class Super(object):
+            @decorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+        Sub = decorator()(lift()(type("Sub", (Super,), {})))
+        self._callFUT(self._makeModule(Sub=Sub, number=1))
+        lifted = getattr(Sub, ATTACH_ATTR)[None]
+        self.assertTrue(isinstance(lifted.extra, tuple))
+        decorator()(Sub)
+        self.assertEqual(len(lifted.extra), 2)
+
+    def test_strict(self):
+        from tests.fixtures import decorator
+        from venusian import lift, onlyliftedfrom
+
+        class Super(object):
+            @decorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+        def function():  # pragma: no cover
+            pass
+
+        self._callFUT(self._makeModule(), strict=True)
+        self.assertRaises(RuntimeError, decorator(), function)
+        self.assertRaises(RuntimeError, lift(), type("Sub", (Super,), {}))
+        self.assertRaises(RuntimeError, onlyliftedfrom(), Super)
+
+    def test_strict_rejects_before_attaching(self):
+        from tests.fixtures import decorator
+        from venusian import ATTACH_ATTR
+
+        def function():  # pragma: no cover
+            pass
+
+        self._callFUT(self._makeModule(), strict=True)
+        self.assertRaises(RuntimeError, decorator(), function)
+        self.assertFalse(hasattr(function, ATTACH_ATTR))
+
+        def create():
+            class Class(object):
+                @decorator()
+                def boo(self):
+                    pass  # pragma: no cover
+
+        self.assertRaises(RuntimeError, create)
+
+    def test_consume(self):
+        from tests.fixtures import decorator
+        from venusian import ATTACH_ATTR, changes_since_freeze
+
+        module = self._makeModule(decorator=decorator)
+        exec("@decorator()\ndef function(): pass", module.__dict__)
+        function = module.function
+        self._callFUT(module, strict=True)
+        test = _Test()
+        scanner = TestScanner._makeOne(None, test=test)
+        self.assertRaises(RuntimeError, scanner.scan, module, consume=True)
+        self.assertTrue(isinstance(getattr(function, ATTACH_ATTR)[None], tuple))
+        self._callFUT(module)
+        scanner.scan(module, consume=True)
+        self.assertFalse(hasattr(function, ATTACH_ATTR))
+        changes = changes_since_freeze()
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(changes[0][0], __file__)
+        self.assertEqual(changes[0][2], "test_consume")
+
+    def test_attach_method(self):
+        from tests.fixtures import methoddecorator
+        from venusian import changes_since_freeze
+
+        self._callFUT(self._makeModule())
+
+        class Class(object):
+            @methoddecorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+        changes = changes_since_freeze()
+        self.assertEqual(len(changes), 1)
+        self.assertEqual(
+            changes[0][1:], (Class.boo.__code__.co_firstlineno, "Class", None)
+        )
+        self._callFUT(self._makeModule(), strict=True)
+
+        def create():
+            class Class(object):
+                @methoddecorator()
+                def boo(self):
+                    pass  # pragma: no cover
+
+        self.assertRaises(RuntimeError, create)
+
+    def test_gc_freeze(self):
+        import gc
+
+        self._callFUT(self._makeModule(), gc_freeze=True)
+        try:
+            self.assertTrue(gc.get_freeze_count() > 0)
+        finally:
+            gc.unfreeze()
+
+
+class Test_attach_method(unittest.TestCase):
+    def _callFUT(self, *arg, **kw):
+        from venusian import attach_method
+
+        return attach_method(*arg, **kw)
+
+    def _scan(self, module):
+        test = _Test()
+        scanner = TestScanner._makeOne(None, test=test)
+        scanner.scan(module)
+        return test.registrations
+
+    def test_scan(self):
+        from tests.fixtures import attach_method
+
+        registrations = self._scan(attach_method)
+        self.assertEqual(
+            [(r["name"], r["attr"]) for r in registrations],
+            [
+                ("Class", "framed"),
+                ("Class", "method"),
+                ("Class", "stacked"),
+                ("Class", "stacked"),
+                ("Sub", "hiss"),
+                ("Sub", "boo"),
+            ],
+        )
+        self.assertTrue(registrations[1]["method"])
+        self.assertTrue(registrations[2]["inner"])
+        self.assertTrue(registrations[3]["outer"])
+        self.assertTrue(registrations[4]["sub"])
+        self.assertTrue(registrations[5]["base"])
+        # the placeholders were replaced by the functions
+        self.assertEqual(attach_method.Class.__dict__["method"].__name__, "method")
+        self.assertTrue(callable(attach_method.Class.__dict__["stacked"]))
+
+    def test_same_as_attach(self):
+        from tests.fixtures import decorator, methoddecorator
+        from venusian import ATTACH_ATTR
+
+        class Framed(object):
+            @decorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+        class Placeholder(object):
+            @methoddecorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+        framed = getattr(Framed, ATTACH_ATTR)
+        placeholder = getattr(Placeholder, ATTACH_ATTR)
+        self.assertEqual(framed.attached_id, (__name__, "Framed"))
+        self.assertEqual(placeholder.attached_id, (__name__, "Placeholder"))
+        self.assertEqual(
+            [entry[1:] for entry in framed[None]],
+            [entry[1:] for entry in placeholder[None]],
+        )
+
+    def test_no_frame_inspection(self):
+        import venusian
+        from tests.fixtures import methoddecorator
+
+        def getFrameInfo(frame):
+            raise AssertionError("frame inspected")
+
+        orig_getFrameInfo = venusian.getFrameInfo
+        venusian.getFrameInfo = getFrameInfo
+        try:
+
+            class Class(object):
+                @methoddecorator()
+                def boo(self):
+                    pass  # pragma: no cover
+
+        finally:
+            venusian.getFrameInfo = orig_getFrameInfo
+        self.assertEqual(len(getattr(Class, venusian.ATTACH_ATTR)[None]), 1)
+
+    def test_payload_and_category(self):
+        from tests.fixtures import payloadhandler
+        from venusian import ATTACH_ATTR, PayloadCallback
+
+        class Class(object):
+            def boo(self):
+                pass  # pragma: no cover
+
+            boo = self._callFUT(
+                boo, payloadhandler, category="mycategory", payload=(("a", 1),)
+            )
+
+        callbacks = getattr(Class, ATTACH_ATTR)["mycategory"]
+        self.assertEqual(len(callbacks), 1)
+        self.assertTrue(isinstance(callbacks[0][0], PayloadCallback))
+        self.assertEqual(callbacks[0][0].payload, (("a", 1),))
+
+    def test_alias(self):
+        from tests.fixtures import methoddecorator
+        from venusian import ATTACH_ATTR
+
+        class Class(object):
+            @methoddecorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+            hiss = boo
+
+        self.assertEqual(len(getattr(Class, ATTACH_ATTR)[None]), 1)
+        self.assertTrue(Class.__dict__["hiss"] is Class.__dict__["boo"])
+        self.assertEqual(Class.__dict__["hiss"].__name__, "boo")
+
+    def test_outside_class(self):
+        from tests.fixtures import methoddecorator
+
+        @methoddecorator()
+        def function(request):
+            return request
+
+        self.assertEqual(function(1), 1)
+
+    def test_consume(self):
+        import importlib
+
+        from tests.fixtures import attach_method
+        from venusian import ATTACH_ATTR, LIFTONLY_ATTR
+
+        test = _Test()
+        scanner = TestScanner._makeOne(None, test=test)
+        try:
+            scanner.scan(attach_method, consume=True)
+            self.assertEqual(len(test.registrations), 6)
+            self.assertFalse(ATTACH_ATTR in attach_method.Class.__dict__)
+            self.assertTrue(LIFTONLY_ATTR in attach_method.Class.__dict__)
+        finally:
+            importlib.reload(attach_method)
+
 
 class Test_lift(unittest.TestCase):
     def _makeOne(self, categories=None):
@@ -946,6 +2181,238 @@ class Test_lift(unittest.TestCase):
         inst = self._makeOne()
         self.assertRaises(RuntimeError, inst, None)
 
+    def _liftids(self, cls, category=None):
+        from venusian import ATTACH_ATTR
+
+        return [
+            (liftid, scope)
+            for cb, mod_name, liftid, scope in getattr(cls, ATTACH_ATTR)[category]
+        ]
+
+    def test_lift_twice(self):
+        from tests.fixtures import decorator
+
+        class Super(object):
+            @decorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+        class Sub(Super):
+            @decorator()
+            def hiss(self):
+                pass  # pragma: no cover
+
+        Sub = self._makeOne()(Sub)
+        before = self._liftids(Sub)
+        Sub = self._makeOne()(Sub)
+        self.assertEqual(self._liftids(Sub), before)
+        self.assertEqual(before, [("hiss None", "class"), ("boo None", "class")])
+
+    def test_foreign_class(self):
+        from tests.fixtures import decorator
+        from venusian import _foreign_modules
+
+        class Super(object):
+            @decorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+        _foreign_modules.discard(__name__)
+        Sub = type("Sub", (Super,), {"__module__": "elsewhere"})
+        self._makeOne()(Sub)
+        self.assertTrue(__name__ in _foreign_modules)
+
+    def test_siblings_share_cached_base(self):
+        from tests.fixtures import decorator
+        from venusian import _lift_cache
+
+        class Super(object):
+            @decorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+            @decorator()
+            def hiss(self):
+                pass  # pragma: no cover
+
+        class Sub1(Super):
+            @decorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+        class Sub2(Super):
+            @decorator()
+            def jump(self):
+                pass  # pragma: no cover
+
+        Sub1 = self._makeOne()(Sub1)
+        self.assertTrue(Super in _lift_cache)
+        cached = _lift_cache[Super][None]
+        Sub2 = self._makeOne()(Sub2)
+        self.assertTrue(_lift_cache[Super][None] is cached)
+        self.assertEqual(
+            self._liftids(Sub1), [("boo None", "class"), ("hiss None", "class")]
+        )
+        self.assertEqual(
+            self._liftids(Sub2),
+            [("jump None", "class"), ("boo None", "class"), ("hiss None", "class")],
+        )
+
+    def test_cache_revalidated_when_base_changes(self):
+        from tests.fixtures import decorator
+        from venusian import _lift_cache
+
+        class Super(object):
+            @decorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+        class Middle(Super):
+            @decorator()
+            def hiss(self):
+                pass  # pragma: no cover
+
+        class Sub1(Middle):
+            pass
+
+        class Sub2(Middle):
+            pass
+
+        Sub1 = self._makeOne()(Sub1)
+        self.assertEqual(
+            self._liftids(Sub1), [("hiss None", "class"), ("boo None", "class")]
+        )
+        # lifting a base after a subclass has been lifted
+        self._makeOne(categories=("other",))(Super)
+        Sub2 = self._makeOne()(Sub2)
+        self.assertEqual(
+            self._liftids(Sub2), [("hiss None", "class"), ("boo None", "class")]
+        )
+        self.assertTrue(_lift_cache[Super][None][0][0].lifted)
+
+    def test_base_decorated_after_lift(self):
+        from tests.fixtures import decorator
+        from venusian import ATTACH_ATTR, _lift_snapshots
+
+        class Super(object):
+            @decorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+        class Sub1(Super):
+            pass
+
+        class Sub2(Super):
+            pass
+
+        Sub1 = self._makeOne()(Sub1)
+        Sub2 = self._makeOne()(Sub2)
+        # both lifts share the snapshot of the base's callbacks
+        self.assertEqual(len(_lift_snapshots[Super]), 1)
+        # a class decorator appends to the base's callback list
+        decorator()(Super)
+        self.assertEqual(len(list(getattr(Super, ATTACH_ATTR)[None])), 2)
+        self.assertEqual(len(list(getattr(Sub1, ATTACH_ATTR)[None])), 1)
+        self.assertEqual(len(list(getattr(Sub2, ATTACH_ATTR)[None])), 1)
+
+    def test_cache_revalidated_when_base_categories_change(self):
+        from tests.fixtures import categorydecorator, decorator
+        from venusian import ATTACH_ATTR
+
+        class Super(object):
+            @decorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+        class Sub1(Super):
+            pass
+
+        class Sub2(Super):
+            pass
+
+        Sub1 = self._makeOne()(Sub1)
+        # a class decorator adds a category to the base's categories in place
+        categorydecorator()(Super)
+        Sub2 = self._makeOne()(Sub2)
+        self.assertEqual(set(getattr(Sub1, ATTACH_ATTR)), {None})
+        self.assertEqual(set(getattr(Sub2, ATTACH_ATTR)), {None, "mycategory"})
+
+    def test_categories_filter_bases_only(self):
+        from tests.fixtures import categorydecorator, categorydecorator2
+
+        class Super(object):
+            @categorydecorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+            @categorydecorator2()
+            def hiss(self):
+                pass  # pragma: no cover
+
+        class Sub(Super):
+            @categorydecorator2()
+            def jump(self):
+                pass  # pragma: no cover
+
+        Sub = self._makeOne(categories=("mycategory",))(Sub)
+        self.assertEqual(self._liftids(Sub, "mycategory"), [("boo None", "class")])
+        self.assertEqual(self._liftids(Sub, "mycategory2"), [("jump None", "class")])
+
+    def test_lifted_callbacks_shared_with_base(self):
+        from tests.fixtures import decorator
+        from venusian import ATTACH_ATTR, LiftedCallbacks
+
+        class Super(object):
+            @decorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+            @decorator()
+            def hiss(self):
+                pass  # pragma: no cover
+
+        class Sub1(Super):
+            @decorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+        class Sub2(Super):
+            pass
+
+        Sub1 = self._makeOne()(Sub1)
+        Sub2 = self._makeOne()(Sub2)
+        callbacks1 = getattr(Sub1, ATTACH_ATTR)[None]
+        callbacks2 = getattr(Sub2, ATTACH_ATTR)[None]
+        self.assertTrue(isinstance(callbacks1, LiftedCallbacks))
+        # both chains end with the node holding Super's own callbacks
+        self.assertTrue(callbacks1.node[2] is callbacks2.node)
+        self.assertEqual(callbacks2.node[0], tuple(getattr(Super, ATTACH_ATTR)[None]))
+        self.assertEqual(len(callbacks1), 2)
+        self.assertEqual(callbacks1[0][2], "boo None")
+        self.assertEqual(callbacks1[0][1], __name__)
+        self.assertTrue(repr(callbacks1).startswith("<LiftedCallbacks [("))
+
+    def test_decorate_lifted_class(self):
+        from tests.fixtures import decorator
+
+        class Super(object):
+            @decorator()
+            def boo(self):
+                pass  # pragma: no cover
+
+        class Sub(Super):
+            pass
+
+        Sub = decorator()(self._makeOne()(Sub))
+        self.assertEqual(
+            self._liftids(Sub), [("boo None", "class"), ("Sub None", "function call")]
+        )
+        # lifting it again keeps the extra callback
+        Sub = self._makeOne()(Sub)
+        self.assertEqual(
+            self._liftids(Sub), [("boo None", "class"), ("Sub None", "function call")]
+        )
+
 
 class Test_onlyliftedfrom(unittest.TestCase):
     def _makeOne(self):
@@ -961,3 +2428,1027 @@ class Test_onlyliftedfrom(unittest.TestCase):
 def md(name):  # pragma: no cover
     if name in sys.modules:
         del sys.modules[name]
+
+
+class Test_cache_import_failures(unittest.TestCase):
+    def setUp(self):
+        from venusian import cache_import_failures
+
+        cache_import_failures()
+
+    def tearDown(self):
+        from venusian import cache_import_failures
+
+        cache_import_failures(False)
+
+    def _scan(self, package):
+        errors = []
+
+        def onerror(name):
+            errors.append((name, sys.exc_info()[1]))
+
+        scanner = TestScanner._makeOne(None, test=_Test())
+        scanner.scan(package, onerror=onerror)
+        return errors
+
+    def test_module(self):
+        from tests.fixtures import importerror
+        from venusian import import_failures
+
+        name = "tests.fixtures.importerror.will_cause_import_error"
+        first = self._scan(importerror)
+        self.assertEqual([n for n, e in first], [name])
+        self.assertTrue(isinstance(first[0][1], ImportError))
+        failures = import_failures()
+        self.assertEqual(list(failures), [name])
+        self.assertTrue(failures[name][1] is first[0][1])
+        # the cached exception is raised again instead of importing again
+        second = self._scan(importerror)
+        self.assertEqual(second, first)
+
+    def test_package(self):
+        from tests.fixtures import importerror_package
+        from venusian import import_failures, walk_packages
+
+        name = "tests.fixtures.importerror_package.will_cause_import_error"
+        first = self._scan(importerror_package)
+        self.assertEqual([n for n, e in first], [name])
+        errors = []
+
+        def onerror(name):
+            errors.append((name, sys.exc_info()[1]))
+
+        list(
+            walk_packages(
+                importerror_package.__path__,
+                importerror_package.__name__ + ".",
+                onerror=onerror,
+            )
+        )
+        self.assertEqual(errors, first)
+        self.assertEqual(list(import_failures()), [name])
+
+    def test_import_workers(self):
+        from tests.fixtures import mainthread
+        from venusian import import_failures
+
+        md("tests.fixtures.mainthread.module")
+        errors = []
+        test = _Test()
+        scanner = TestScanner._makeOne(None, test=test)
+        scanner.scan(mainthread, onerror=errors.append, import_workers=2)
+        # failing in a worker isn't cached: the module imports in the scan
+        self.assertEqual(errors, [])
+        self.assertEqual(import_failures(), {})
+        self.assertEqual(len(test.registrations), 1)
+
+    def test_reset(self):
+        from tests.fixtures import importerror, importerror_package
+        from venusian import import_failures, reset_import_failures
+
+        module = "tests.fixtures.importerror.will_cause_import_error"
+        package = "tests.fixtures.importerror_package.will_cause_import_error"
+        first = self._scan(importerror)
+        self._scan(importerror_package)
+        self.assertEqual(sorted(import_failures()), [module, package])
+        reset_import_failures("tests.fixtures.importerror")
+        self.assertEqual(list(import_failures()), [package])
+        second = self._scan(importerror)
+        self.assertFalse(second[0][1] is first[0][1])
+        reset_import_failures()
+        self.assertEqual(import_failures(), {})
+
+    def test_disable(self):
+        from tests.fixtures import importerror
+        from venusian import (
+            cache_import_failures,
+            import_failures,
+            reset_import_failures,
+        )
+
+        self._scan(importerror)
+        cache_import_failures()
+        self.assertEqual(len(import_failures()), 1)
+        cache_import_failures(False)
+        self.assertEqual(import_failures(), {})
+        reset_import_failures()
+        first = self._scan(importerror)
+        second = self._scan(importerror)
+        self.assertFalse(second[0][1] is first[0][1])
+        self.assertEqual(import_failures(), {})
+
+    def test_imported_since(self):
+        from venusian import _import, _import_failures
+
+        _import_failures["tests.fixtures.one"] = (None, ImportError(), None)
+        import tests.fixtures.one  # noqa: F401
+
+        _import("tests.fixtures.one")
+
+
+class Test_attachment_stats(unittest.TestCase):
+    def _callFUT(self, package=None):
+        from venusian import attachment_stats
+
+        return attachment_stats(package)
+
+    def test_module(self):
+        from tests.fixtures import category
+
+        stats = self._callFUT(category)
+        self.assertEqual(stats["objects"], 2)
+        self.assertEqual(stats["callbacks"], 2)
+        self.assertEqual(stats["modules"], {"tests.fixtures.category": 2})
+        self.assertEqual(stats["categories"], {"mycategory": 1, "mycategory2": 1})
+        self.assertEqual(stats["scopes"], {"module": 2})
+        self.assertEqual(stats["lifted"], 0)
+        self.assertTrue(stats["bytes"] > 0)
+
+    def test_lifted(self):
+        from tests.fixtures import lifting5
+
+        stats = self._callFUT(lifting5)
+        self.assertEqual(stats["objects"], 3)
+        self.assertEqual(stats["callbacks"], 15)
+        self.assertEqual(stats["categories"], {None: 15})
+        self.assertEqual(stats["scopes"], {"class": 15})
+        self.assertEqual(stats["lifted"], 2)
+
+    def test_shared_chain_counted_once(self):
+        from tests.fixtures import lifting5
+        from venusian import ATTACH_ATTR, _callbacks_size
+
+        sized = set()
+        sub = getattr(lifting5.Sub, ATTACH_ATTR)[None]
+        super2 = getattr(lifting5.Super2, ATTACH_ATTR)[None]
+        self.assertTrue(_callbacks_size(super2, sized) > 0)
+        shared = _callbacks_size(sub, sized)
+        self.assertEqual(_callbacks_size(sub, sized), 0)
+        self.assertTrue(shared < _callbacks_size(sub, set()))
+
+    def test_extra(self):
+        from venusian import LiftedCallbacks, _callbacks_size
+
+        callbacks = LiftedCallbacks("mod", None)
+        empty = _callbacks_size(callbacks, set())
+        callbacks.append((None, "mod", "f f", "class"))
+        self.assertTrue(_callbacks_size(callbacks, set()) > empty)
+
+    def test_all_modules(self):
+        from tests.fixtures import category  # noqa: F401
+
+        stats = self._callFUT()
+        self.assertEqual(stats["modules"]["tests.fixtures.category"], 2)
+        self.assertTrue(stats["objects"] >= 2)
+
+
+class Test_consume(unittest.TestCase):
+    def setUp(self):
+        import importlib
+
+        md("tests.fixtures.consume")
+        self.module = importlib.import_module("tests.fixtures.consume")
+
+    def tearDown(self):
+        md("tests.fixtures.consume")
+        md("venusian_test_consume")
+
+    def _scan(self, module, **kw):
+        test = _Test()
+        scanner = TestScanner._makeOne(None, test=test)
+        scanner.scan(module, **kw)
+        return sorted((r["name"], sorted(r)) for r in test.registrations)
+
+    def _subclass(self, base):
+        # a class lifted from base, defined after it was scanned
+        import types
+
+        module = types.ModuleType("venusian_test_consume")
+        module.Base = base
+        sys.modules[module.__name__] = module
+        exec(
+            "from venusian import lift\n" "@lift()\n" "class Sub(Base):\n" "    pass\n",
+            module.__dict__,
+        )
+        return module
+
+    def test_consume_all(self):
+        from venusian import ATTACH_ATTR, LIFTONLY_ATTR
+
+        module = self.module
+        self.assertEqual(len(self._scan(module, consume=True)), 7)
+        self.assertFalse(hasattr(module.function, ATTACH_ATTR))
+        self.assertFalse(ATTACH_ATTR in module.Class.__dict__)
+        self.assertEqual(
+            sorted(module.Class.__dict__[LIFTONLY_ATTR]),
+            ["mycategory", "mycategory2"],
+        )
+        self.assertEqual(self._scan(module), [])
+        # lift still finds the consumed callbacks of the classes
+        self.assertEqual(len(self._scan(self._subclass(module.Class))), 2)
+        self.assertEqual(len(self._scan(self._subclass(module.Lifted))), 3)
+
+    def test_consume_categories(self):
+        from venusian import ATTACH_ATTR, LIFTONLY_ATTR
+
+        module = self.module
+        self.assertEqual(
+            len(self._scan(module, categories=["mycategory"], consume=True)), 4
+        )
+        self.assertEqual(list(getattr(module.function, ATTACH_ATTR)), ["mycategory2"])
+        self.assertEqual(list(module.Class.__dict__[ATTACH_ATTR]), ["mycategory2"])
+        self.assertEqual(list(module.Class.__dict__[LIFTONLY_ATTR]), ["mycategory"])
+        self.assertEqual(len(self._scan(module)), 3)
+        self.assertEqual(len(self._scan(self._subclass(module.Class))), 2)
+        self.assertEqual(len(self._scan(module, consume=True)), 3)
+        self.assertEqual(self._scan(module), [])
+
+    def test_not_consumed(self):
+        module = self.module
+        first = self._scan(module)
+        self.assertEqual(len(first), 7)
+        self.assertEqual(self._scan(module), first)
+
+    def test_multiscan(self):
+        from venusian import ATTACH_ATTR, Scanner, multiscan
+
+        module = self.module
+        test1 = _Test()
+        test2 = _Test()
+        multiscan(
+            module,
+            [
+                (Scanner(test=test1), {"consume": True}),
+                (Scanner(test=test2), {"consume": True}),
+            ],
+        )
+        self.assertEqual(len(test1.registrations), 7)
+        self.assertEqual(len(test2.registrations), 7)
+        self.assertFalse(hasattr(module.function, ATTACH_ATTR))
+
+    def test_alias(self):
+        from venusian import ATTACH_ATTR
+
+        module = self.module
+        module.alias = module.function
+        self.assertEqual(len(self._scan(module, consume=True)), 9)
+        self.assertFalse(hasattr(module.function, ATTACH_ATTR))
+
+    def test_redecorated_elsewhere(self):
+        from venusian import ATTACH_ATTR, LIFTONLY_ATTR
+
+        try:
+            from tests.fixtures import redecorated
+            from tests.fixtures.redecorated import one, two  # noqa: F401
+
+            # one's callbacks (run twice for the alias) don't consume two's
+            self.assertEqual(len(self._scan(one, consume=True)), 5)
+            self.assertEqual(len(getattr(one.function, ATTACH_ATTR)["mycategory"]), 1)
+            # lift finds the callbacks of both modules
+            self.assertEqual(len(self._scan(self._subclass(one.Class))), 2)
+            self.assertEqual(len(self._scan(redecorated, consume=True)), 2)
+            self.assertFalse(hasattr(one.function, ATTACH_ATTR))
+            self.assertEqual(len(one.Class.__dict__[LIFTONLY_ATTR]["mycategory"]), 2)
+        finally:
+            md("tests.fixtures.redecorated.two")
+            md("tests.fixtures.redecorated.one")
+            md("tests.fixtures.redecorated")
+
+
+class Test_threads(unittest.TestCase):
+    nthreads = 8
+
+    def setUp(self):
+        # switch threads as often as possible to provoke races on builds
+        # with a GIL too
+        self.interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.interval)
+        md("tests.fixtures.consume")
+
+    def _run(self, target):
+        import threading
+
+        barrier = threading.Barrier(self.nthreads)
+        errors = []
+
+        def run(i):
+            barrier.wait()
+            try:
+                target(i)
+            except BaseException as e:  # pragma: no cover
+                errors.append(e)
+
+        threads = [
+            threading.Thread(target=run, args=(i,)) for i in range(self.nthreads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_attach_same_objects(self):
+        import types
+
+        from venusian import ATTACH_ATTR, attach
+
+        code = compile("pass", "<wrapped>", "exec")
+        functions = [types.FunctionType(code, {}) for i in range(500)]
+
+        def callback(scanner, name, ob):  # pragma: no cover
+            pass
+
+        def target(i):
+            # every thread attaches to each function in turn
+            for wrapped in functions:
+                attach(wrapped, callback, category=i % 2)
+
+        self._run(target)
+        for wrapped in functions:
+            categories = getattr(wrapped, ATTACH_ATTR)
+            self.assertEqual(sorted(categories), [0, 1])
+            self.assertEqual(
+                sum(len(callbacks) for callbacks in categories.values()),
+                self.nthreads,
+            )
+
+    def test_attach_and_scan(self):
+        from tests.fixtures import category
+        from venusian import ATTACH_ATTR, attach
+
+        functions = []
+
+        def callback(scanner, name, ob):  # pragma: no cover
+            pass
+
+        def target(i):
+            if i % 2:
+                for j in range(100):
+
+                    def wrapped():  # pragma: no cover
+                        pass
+
+                    attach(wrapped, callback, category="thread")
+                    attach(wrapped, callback, category="thread")
+                    functions.append(wrapped)
+            else:
+                for j in range(20):
+                    test = _Test()
+                    scanner = TestScanner._makeOne(None, test=test)
+                    scanner.scan(category)
+                    self.assertEqual(len(test.registrations), 2)
+
+        self._run(target)
+        self.assertEqual(len(functions), self.nthreads // 2 * 100)
+        for wrapped in functions:
+            self.assertEqual(len(getattr(wrapped, ATTACH_ATTR)["thread"]), 2)
+
+    def test_consume(self):
+        import importlib
+
+        md("tests.fixtures.consume")
+        module = importlib.import_module("tests.fixtures.consume")
+        registrations = []
+
+        def target(i):
+            test = _Test()
+            scanner = TestScanner._makeOne(None, test=test)
+            scanner.scan(module, consume=True)
+            registrations.extend(test.registrations)
+
+        self._run(target)
+        # each callback ran at least once, before it was consumed
+        self.assertTrue(len(registrations) >= 7)
+        test = _Test()
+        TestScanner._makeOne(None, test=test).scan(module)
+        self.assertEqual(test.registrations, [])
+
+    def test_walk_packages(self):
+        from tests.fixtures import subpackages
+        from venusian import walk_packages
+
+        expected = sorted(
+            name
+            for importer, name, ispkg in walk_packages(
+                subpackages.__path__, "tests.fixtures.subpackages.", lambda n: None
+            )
+        )
+        results = []
+
+        def target(i):
+            results.append(
+                sorted(
+                    name
+                    for importer, name, ispkg in walk_packages(
+                        subpackages.__path__,
+                        "tests.fixtures.subpackages.",
+                        lambda n: None,
+                    )
+                )
+            )
+
+        self._run(target)
+        self.assertEqual(results, [expected] * self.nthreads)
+
+
+class Test_compile_package(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+
+        self.root = tempfile.mkdtemp()
+        files = {
+            "venusian_compiled/__init__.py": "",
+            "venusian_compiled/one.py": "x = 1\n",
+            "venusian_compiled/broken.py": "x = (\n",
+            "venusian_compiled/sub/__init__.py": "",
+            "venusian_compiled/sub/two.py": "y = 2\n",
+            "venusian_compiled/ignored/__init__.py": "",
+            "venusian_compiled/ignored/three.py": "z = 3\n",
+        }
+        for name, source in files.items():
+            path = os.path.join(self.root, *name.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(source)
+        sys.path.insert(0, self.root)
+        import venusian_compiled
+
+        self.package = venusian_compiled
+
+    def tearDown(self):
+        import shutil
+
+        sys.path.remove(self.root)
+        md("venusian_compiled")
+        shutil.rmtree(self.root)
+
+    def _callFUT(self, *arg, **kw):
+        from venusian import compile_package
+
+        return compile_package(self.package, *arg, **kw)
+
+    def _pyc(self, *parts):
+        import importlib.util
+
+        source = os.path.join(self.root, "venusian_compiled", *parts)
+        pyc = importlib.util.cache_from_source(source)
+        if os.path.exists(pyc):
+            with open(pyc, "rb") as f:
+                return f.read(8)
+
+    def test_compile(self):
+        self.assertTrue(self._callFUT(workers=2, ignore=".broken"))
+        self.assertFalse(self._callFUT())
+        self.assertTrue(self._pyc("one.py") is not None)
+        self.assertTrue(self._pyc("sub", "__init__.py") is not None)
+        self.assertTrue(self._pyc("sub", "two.py") is not None)
+        self.assertTrue(self._pyc("broken.py") is None)
+
+    def test_ignore_and_invalidation_mode(self):
+        import py_compile
+
+        result = self._callFUT(
+            workers=1,
+            ignore=[".broken", ".ignored"],
+            invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+        )
+        self.assertTrue(result)
+        # the flags of an unchecked hash-based pyc
+        self.assertEqual(self._pyc("sub", "two.py")[4:8], b"\x01\x00\x00\x00")
+        self.assertTrue(self._pyc("ignored", "three.py") is None)
+        self.assertTrue(self._pyc("ignored", "__init__.py") is None)
+
+
+class TestModulePolicy(unittest.TestCase):
+    def _makeOne(self, *arg, **kw):
+        from venusian import ModulePolicy
+
+        return ModulePolicy(*arg, **kw)
+
+    def _module(self, name, loader=None, origin=None):
+        import types
+        from importlib.machinery import ModuleSpec
+
+        module = types.ModuleType(name)
+        module.__spec__ = ModuleSpec(name, loader, origin=origin)
+        module.number = 1
+        return module
+
+    def _scan(self, package, policy):
+        test = _Test()
+        scanner = TestScanner._makeOne(None, test=test)
+        scanner.scan(package, module_policy=policy)
+        return test.registrations
+
+    def test_module_kind(self):
+        from importlib.machinery import (
+            EXTENSION_SUFFIXES,
+            ExtensionFileLoader,
+            SourcelessFileLoader,
+        )
+
+        from tests.fixtures import one
+        from venusian import _module_kind
+
+        name = "venusian_kind"
+        filename = name + EXTENSION_SUFFIXES[0]
+        extension = [
+            self._module(name, ExtensionFileLoader(name, filename)),
+            self._module(name, origin=filename),
+        ]
+        for module in extension:
+            self.assertEqual(_module_kind(module), "extension")
+        sourceless = [
+            self._module(name, SourcelessFileLoader(name, name + ".pyc")),
+            self._module(name, origin=name + ".pyc"),
+        ]
+        for module in sourceless:
+            self.assertEqual(_module_kind(module), "sourceless")
+        self.assertEqual(_module_kind(one), "source")
+        self.assertEqual(_module_kind(self._module(name)), "source")
+
+    def test_skip_extension(self):
+        from importlib.machinery import EXTENSION_SUFFIXES
+
+        module = self._module("venusian_extension", origin="x" + EXTENSION_SUFFIXES[0])
+        policy = self._makeOne()
+        self.assertEqual(self._scan(module, policy), [])
+        self.assertEqual(policy.modules, {"extension": 1, "sourceless": 0, "source": 0})
+        self.assertEqual(policy.skipped["extension"], len(vars(module)))
+
+    def test_skip_sourceless(self):
+        import py_compile
+        import shutil
+        import tempfile
+
+        directory = tempfile.mkdtemp()
+        source = os.path.join(directory, "venusian_sourceless.py")
+        with open(source, "w") as f:
+            f.write(
+                "from tests.fixtures import decorator\n"
+                "@decorator(function=True)\n"
+                "def function(request):  # pragma: no cover\n"
+                "    return request\n"
+            )
+        py_compile.compile(source, cfile=source + "c")
+        os.remove(source)
+        sys.path.insert(0, directory)
+        try:
+            import venusian_sourceless
+
+            policy = self._makeOne(sourceless=0)
+            self.assertEqual(self._scan(venusian_sourceless, policy), [])
+            self.assertEqual(policy.modules["sourceless"], 1)
+            self.assertTrue(policy.skipped["sourceless"] > 0)
+            registrations = self._scan(venusian_sourceless, self._makeOne())
+            self.assertEqual(len(registrations), 1)
+        finally:
+            sys.path.remove(directory)
+            md("venusian_sourceless")
+            shutil.rmtree(directory)
+
+    def test_limit(self):
+        from tests.fixtures import one
+
+        policy = self._makeOne(source=1)
+        registrations = self._scan(one, policy)
+        # only the first member of each module, Class, is examined
+        self.assertEqual([r["name"] for r in registrations], ["Class", "Class"])
+        self.assertEqual(policy.modules["source"], 3)
+        self.assertTrue(policy.skipped["source"] > 0)
+        self.assertEqual(policy.skipped["extension"], 0)
+        self.assertEqual(len(self._scan(one, self._makeOne())), 6)
+
+
+class DummyTOCImporter(object):
+    def __init__(self, toc, packages=None):
+        self.toc = toc
+        if packages is not None:
+            self.is_package = packages.__contains__
+
+
+class Test_discovery(unittest.TestCase):
+    def _scan(self, package, discovery):
+        test = _Test()
+        scanner = TestScanner._makeOne(None, test=test)
+        scanner.scan(package, discovery=discovery)
+        return [r["ob"].__module__ for r in test.registrations]
+
+    def test_manifest(self):
+        from tests.fixtures import categorypkg
+        from venusian import ManifestDiscovery
+
+        discovery = ManifestDiscovery(["tests.fixtures.categorypkg.one"])
+        self.assertEqual(
+            self._scan(categorypkg, discovery), ["tests.fixtures.categorypkg.one"]
+        )
+        # parents missing from the manifest are packages
+        discovery = ManifestDiscovery(["tests.fixtures.categorypkg.sub.two"])
+        self.assertEqual(
+            self._scan(categorypkg, discovery),
+            ["tests.fixtures.categorypkg.sub.two"],
+        )
+
+    def test_toc(self):
+        from tests.fixtures import categorypkg
+        from venusian import TOCDiscovery
+
+        def is_package(name):
+            raise ImportError(name)
+
+        broken = DummyTOCImporter(["tests.fixtures.categorypkg.broken"])
+        broken.is_package = is_package
+        discovery = TOCDiscovery(
+            [
+                object(),
+                DummyTOCImporter(
+                    [
+                        "tests.fixtures.categorypkg.sub",
+                        "tests.fixtures.categorypkg.one",
+                    ],
+                    packages={"tests.fixtures.categorypkg.sub"},
+                ),
+                DummyTOCImporter(
+                    ["tests.fixtures.categorypkg.sub", "tests.fixtures.categorypkg"]
+                ),
+                broken,
+            ]
+        )
+        find_modules = discovery.index()
+        self.assertEqual(
+            list(find_modules(None, "tests.fixtures.categorypkg.")),
+            [
+                (None, "tests.fixtures.categorypkg.broken", False),
+                (None, "tests.fixtures.categorypkg.one", False),
+                (None, "tests.fixtures.categorypkg.sub", True),
+            ],
+        )
+        errors = []
+        test = _Test()
+        scanner = TestScanner._makeOne(None, test=test)
+        scanner.scan(categorypkg, discovery=discovery, onerror=errors.append)
+        self.assertEqual(errors, ["tests.fixtures.categorypkg.broken"])
+        self.assertEqual(
+            [r["ob"].__module__ for r in test.registrations],
+            ["tests.fixtures.categorypkg.one"],
+        )
+
+    def test_toc_meta_path(self):
+        from venusian import TOCDiscovery
+
+        self.assertEqual(list(TOCDiscovery().index()(None, "tests.")), [])
+
+    def test_walk_packages(self):
+        from venusian import ManifestDiscovery, walk_packages
+
+        discovery = ManifestDiscovery(
+            ["tests.fixtures.categorypkg.one", "tests.fixtures.categorypkg.sub.two"]
+        )
+        self.assertEqual(
+            [name for importer, name, ispkg in walk_packages(discovery=discovery)],
+            [
+                "tests",
+                "tests.fixtures",
+                "tests.fixtures.categorypkg",
+                "tests.fixtures.categorypkg.one",
+                "tests.fixtures.categorypkg.sub",
+                "tests.fixtures.categorypkg.sub.two",
+            ],
+        )
+
+    def test_import_workers(self):
+        from tests.fixtures import threaded
+        from venusian import ManifestDiscovery
+
+        for name in ["tests.fixtures.threaded.a", "tests.fixtures.threaded.sub"]:
+            md(name)
+        md("tests.fixtures.threaded.sub.c")
+        discovery = ManifestDiscovery(
+            ["tests.fixtures.threaded.a", "tests.fixtures.threaded.sub.c"]
+        )
+        test = _Test()
+        scanner = TestScanner._makeOne(None, test=test)
+        scanner.scan(threaded, discovery=discovery, import_workers=2)
+        self.assertEqual(
+            [r["ob"].__module__ for r in test.registrations],
+            [
+                "tests.fixtures.threaded",
+                "tests.fixtures.threaded.a",
+                "tests.fixtures.threaded.sub",
+                "tests.fixtures.threaded.sub.c",
+            ],
+        )
+
+
+def entry_point(group, value):
+    from importlib.metadata import EntryPoint
+
+    return EntryPoint(name="dummy", value=value, group=group)
+
+
+class Test_scan_entry_points(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+
+        import venusian
+
+        self.entry_points = [
+            # a module-only entry point with extras
+            entry_point("plugins", "tests.fixtures.categorypkg [speedups]"),
+            entry_point("plugins", "tests.fixtures.categorypkg.one:function"),
+            entry_point("plugins", "tests.fixtures.category : function"),
+            entry_point("plugins", "tests.fixtures.category:function2"),
+            entry_point("other", "tests.fixtures.one"),
+        ]
+        self.calls = 0
+
+        def all_entry_points():
+            self.calls += 1
+            return iter(self.entry_points)
+
+        self.orig_all_entry_points = venusian._all_entry_points
+        venusian._all_entry_points = all_entry_points
+        venusian._entry_points = None
+        self.root = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.root, "entry_points.json")
+
+    def tearDown(self):
+        import shutil
+
+        import venusian
+
+        venusian._all_entry_points = self.orig_all_entry_points
+        venusian._entry_points = None
+        shutil.rmtree(self.root)
+
+    def _callFUT(self, group, **kw):
+        from venusian import scan_entry_points
+
+        test = _Test()
+        scanner = TestScanner._makeOne(None, test=test)
+        scanned = scan_entry_points(scanner, group, **kw)
+        return scanned, sorted(r["ob"].__module__ for r in test.registrations)
+
+    def test_scan(self):
+        scanned, modules = self._callFUT("plugins")
+        self.assertEqual(
+            scanned, ["tests.fixtures.category", "tests.fixtures.categorypkg"]
+        )
+        self.assertEqual(
+            modules,
+            [
+                "tests.fixtures.category",
+                "tests.fixtures.category",
+                "tests.fixtures.categorypkg.one",
+                "tests.fixtures.categorypkg.sub.two",
+            ],
+        )
+        scanned, modules = self._callFUT("plugins", categories=["mycategory2"])
+        self.assertEqual(
+            modules,
+            ["tests.fixtures.category", "tests.fixtures.categorypkg.sub.two"],
+        )
+        self.assertEqual(self._callFUT("missing"), ([], []))
+        self.assertEqual(self.calls, 1)
+
+    def test_onerror(self):
+        from venusian import scan_entry_points
+
+        self.entry_points.append(entry_point("broken", "tests.fixtures.nope"))
+        self.entry_points.append(entry_point("broken", "tests.fixtures.one"))
+        scanner = TestScanner._makeOne(None, test=_Test())
+        self.assertRaises(ImportError, scan_entry_points, scanner, "broken")
+        errors = []
+        scanned = scan_entry_points(scanner, "broken", onerror=errors.append)
+        self.assertEqual(errors, ["tests.fixtures.nope"])
+        self.assertEqual(scanned, ["tests.fixtures.one"])
+
+    def test_cache_file(self):
+        import venusian
+
+        self._callFUT("plugins", cache_file=self.cache_file)
+        self.assertEqual(self.calls, 1)
+        # a new process reads the index from the file
+        venusian._entry_points = None
+        scanned, modules = self._callFUT("other", cache_file=self.cache_file)
+        self.assertEqual(scanned, ["tests.fixtures.one"])
+        self.assertEqual(self.calls, 1)
+        # the index is rebuilt when a directory on sys.path changes
+        site = os.path.join(self.root, "site")
+        os.mkdir(site)
+        sys.path.append(site)
+        try:
+            self._callFUT("other", cache_file=self.cache_file)
+            self.assertEqual(self.calls, 2)
+            venusian._entry_points = None
+            self._callFUT("other", cache_file=self.cache_file)
+            self.assertEqual(self.calls, 2)
+            with open(os.path.join(site, "new.pth"), "w"):
+                pass
+            os.utime(site, ns=(0, 0))
+            self._callFUT("other", cache_file=self.cache_file)
+            self.assertEqual(self.calls, 3)
+        finally:
+            sys.path.remove(site)
+
+    def test_bad_cache_file(self):
+        import venusian
+
+        with open(self.cache_file, "w") as f:
+            f.write("{")
+        self._callFUT("plugins", cache_file=self.cache_file)
+        self.assertEqual(self.calls, 1)
+        # an unwritable cache file doesn't matter
+        venusian._entry_points = None
+        missing = os.path.join(self.root, "missing", "entry_points.json")
+        self._callFUT("plugins", cache_file=missing)
+        self.assertEqual(self.calls, 2)
+        self.assertFalse(os.path.exists(missing))
+
+    def test_all_entry_points(self):
+        self.assertTrue(
+            all(
+                hasattr(ep, "group") and hasattr(ep, "value")
+                for ep in self.orig_all_entry_points()
+            )
+        )
+
+
+class TestRecordDiscovery(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+
+        self.site = tempfile.mkdtemp()
+        decorated = (
+            "from tests.fixtures import decorator\n"
+            "@decorator(function=True)\n"
+            "def function(request):  # pragma: no cover\n"
+            "    return request\n"
+        )
+        files = {
+            "venusian_recorded/__init__.py": "",
+            "venusian_recorded/a.py": decorated,
+            "venusian_recorded/unlisted.py": decorated,
+            "venusian_recorded/data.txt": "",
+            "venusian_recorded/not-a-module.py": "",
+            "venusian_recorded/__pycache__/a.cpython-311.pyc": "",
+            "venusian_recorded/sub/__init__.py": decorated,
+            "venusian_recorded/sub/b.py": decorated,
+            "venusian_recorded/sub/_speedups.abi3.so": "",
+        }
+        for name, source in files.items():
+            path = os.path.join(self.site, *name.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(source)
+        dist_info = os.path.join(self.site, "venusian_recorded-1.0.dist-info")
+        os.mkdir(dist_info)
+        with open(os.path.join(dist_info, "METADATA"), "w") as f:
+            f.write("Metadata-Version: 2.1\nName: venusian-recorded\nVersion: 1.0\n")
+        with open(os.path.join(dist_info, "RECORD"), "w") as f:
+            for name in files:
+                if name == "venusian_recorded/sub/b.py":
+                    f.write('"%s",,\n' % name)
+                elif name != "venusian_recorded/unlisted.py":
+                    f.write("%s,,\n" % name)
+            f.write("venusian_recorded-1.0.dist-info/RECORD,,\n")
+        sys.path.insert(0, self.site)
+        import venusian_recorded
+
+        self.package = venusian_recorded
+
+    def tearDown(self):
+        import shutil
+
+        sys.path.remove(self.site)
+        for name in list(sys.modules):
+            if name.startswith("venusian_recorded"):
+                md(name)
+        shutil.rmtree(self.site)
+
+    def _makeOne(self, *arg):
+        from venusian import RecordDiscovery
+
+        return RecordDiscovery(*arg)
+
+    def _distribution(self):
+        from importlib.metadata import PathDistribution
+        from pathlib import Path
+
+        return PathDistribution(Path(self.site, "venusian_recorded-1.0.dist-info"))
+
+    def _scan(self, package, discovery):
+        test = _Test()
+        scanner = TestScanner._makeOne(None, test=test)
+        scanner.scan(package, discovery=discovery, onerror=lambda name: None)
+        return [r["ob"].__module__ for r in test.registrations]
+
+    def test_record(self):
+        find_modules = self._makeOne([self._distribution()]).index()
+        self.assertEqual(
+            list(find_modules(self.package.__path__, "venusian_recorded.")),
+            [
+                (None, "venusian_recorded.a", False),
+                (None, "venusian_recorded.sub", True),
+            ],
+        )
+        import venusian_recorded.sub
+
+        self.assertEqual(
+            [
+                name
+                for importer, name, ispkg in find_modules(
+                    venusian_recorded.sub.__path__, "venusian_recorded.sub."
+                )
+            ],
+            ["venusian_recorded.sub._speedups", "venusian_recorded.sub.b"],
+        )
+
+    def test_scan(self):
+        discovery = self._makeOne([self._distribution()])
+        self.assertEqual(
+            self._scan(self.package, discovery),
+            [
+                "venusian_recorded.a",
+                "venusian_recorded.sub",
+                "venusian_recorded.sub.b",
+            ],
+        )
+
+    def test_distribution_name(self):
+        discovery = self._makeOne(["venusian-recorded"])
+        find_modules = discovery.index()
+        self.assertEqual(
+            len(list(find_modules(self.package.__path__, "venusian_recorded."))),
+            2,
+        )
+
+    @unittest.skipIf(
+        sys.version_info < (3, 10), "importlib.metadata.packages_distributions"
+    )
+    def test_packages_distributions(self):
+        find_modules = self._makeOne().index()
+        self.assertEqual(
+            len(list(find_modules(self.package.__path__, "venusian_recorded."))),
+            2,
+        )
+
+    def test_deleted(self):
+        os.remove(os.path.join(self.site, "venusian_recorded", "a.py"))
+        find_modules = self._makeOne([self._distribution()]).index()
+        self.assertEqual(
+            list(find_modules(self.package.__path__, "venusian_recorded.")),
+            [(None, "venusian_recorded.sub", True)],
+        )
+
+    def test_no_record(self):
+        os.remove(os.path.join(self.site, "venusian_recorded-1.0.dist-info", "RECORD"))
+        find_modules = self._makeOne([self._distribution()]).index()
+        self.assertEqual(
+            [
+                name
+                for importer, name, ispkg in find_modules(
+                    self.package.__path__, "venusian_recorded."
+                )
+            ],
+            [
+                "venusian_recorded.a",
+                "venusian_recorded.not-a-module",
+                "venusian_recorded.sub",
+                "venusian_recorded.unlisted",
+            ],
+        )
+
+    def test_fallback(self):
+        from tests.fixtures import categorypkg
+
+        find_modules = self._makeOne([self._distribution()]).index()
+        # not installed from the distribution
+        self.assertEqual(
+            [
+                name
+                for importer, name, ispkg in find_modules(
+                    categorypkg.__path__, "tests.fixtures.categorypkg."
+                )
+            ],
+            ["tests.fixtures.categorypkg.one", "tests.fixtures.categorypkg.sub"],
+        )
+        # recorded elsewhere than the package's __path__
+        checkout = os.path.join(self.site, "checkout")
+        os.mkdir(checkout)
+        with open(os.path.join(checkout, "c.py"), "w"):
+            pass
+        self.assertEqual(
+            [
+                name
+                for importer, name, ispkg in find_modules(
+                    [checkout], "venusian_recorded."
+                )
+            ],
+            ["venusian_recorded.c"],
+        )
+        # top-level modules
+        self.assertTrue(len(list(find_modules(None, ""))) > 0)